@@ -1,61 +1,231 @@
+import os
+import signal
+import threading
 import time
 
+import storage.db
 from storage.db import init_db
+from storage.wakeup import open_wakeup
 from application.services.scoring_service import ScoringService
 from application.services.learning_service import LearningService
 from application.runners.scoring_runner import ScoringAgentRunner
 from application.runners.retrain_runner import RetrainAgentRunner
 from application.services.db_queue_service import DbQueueService
 from application.services.dataset_classifier import DatasetClassifier
+from application.services.symptom_matrix import NUMPY_AVAILABLE
+from application.services.retrain_service import RetrainMetrics, RetrainService
+from application.services.agent_metrics import AgentProfiler, MetricsFile
 
+DATASET_PATH = "data/Medicina_Dataset.csv"
+# index built by ingest_dataset.py, e.g. AGENT_INDEX=data/index.idx; when unset
+# (or unreadable) the classifier uses the dataset's own snapshot
+INDEX_PATH = os.environ.get("AGENT_INDEX") or None
+MODEL_VERSION = "dataset-v1"
+# base top-k precomputed for every combination of up to this many symptoms
+PRECOMPUTE_SYMPTOMS = 5
+BATCH_SIZE = 64
+IDLE_SLEEP_MIN = 0.1
+IDLE_SLEEP_MAX = 2.0
+LEASE_SECONDS = 120
+REAP_INTERVAL = 30
+RETRAIN_CHECK_INTERVAL = 60
+MODEL_SYNC_INTERVAL = 5
 
-def run_agent():
-    init_db()
-
-    queue_service = DbQueueService()
-    learning_service = LearningService()
 
+def build_classifier(
+    learning_service: LearningService,
+    dataset_path: str = DATASET_PATH,
+    index_path: str = INDEX_PATH
+) -> DatasetClassifier:
     classifier = DatasetClassifier(
-        "data/Medicina_Dataset.csv",
-        learning_service
+        dataset_path,
+        learning_service,
+        vectorized=NUMPY_AVAILABLE,
+        snapshot=True,
+        index_path=index_path,
+        precompute=PRECOMPUTE_SYMPTOMS,
     )
+    # only the model's symptoms get mask bits; free text is matched by text
+    storage.db.register_symptoms(classifier.symptoms_by_frequency())
+    return classifier
+
 
+def build_scoring_runner(
+    classifier: DatasetClassifier,
+    learning_service: LearningService,
+    queue_service: DbQueueService
+) -> ScoringAgentRunner:
     scoring_service = ScoringService(
         classifier=classifier,
         learning_service=learning_service,
-        model_version="dataset-v1",
+        model_version=MODEL_VERSION,
     )
 
-    scoring_runner = ScoringAgentRunner(
+    return ScoringAgentRunner(
         queue_service=queue_service,
         scoring_service=scoring_service
     )
 
-    retrain_runner = RetrainAgentRunner(
-        learning_service=learning_service,
-        rejection_threshold=0.3
-    )
 
-    print("🤖 Agent started")
+def run_scoring_loop(
+    scoring_runner: ScoringAgentRunner,
+    should_stop=None,
+    after_drain=None,
+    metrics: RetrainMetrics = None
+):
+    """
+    Drains the queue until should_stop() returns True, sleeping (with backoff)
+    only while the queue is empty. `after_drain` runs after every drain attempt.
+
+    While idle it waits on a wakeup socket that insert_case signals, so new
+    cases are picked up at once; the backoff sleep remains the fallback poll.
+
+    The runner's metrics are written to a metrics file (see agent_metrics)
+    for the API's /metrics; SQL statement counting is switched on for them. AGENT_PROFILE=1 profiles the loop from the start;
+    SIGUSR1 switches profiling on and off.
+    """
+    storage.db.enable_statement_counting()
+    wakeup = open_wakeup(storage.db.DB_PATH)
+    metrics_file = MetricsFile(scoring_runner.metrics, metrics)
+    profiler = AgentProfiler(enabled=os.environ.get("AGENT_PROFILE") == "1")
+
+    # signal handlers can only be installed from the main thread
+    if hasattr(signal, "SIGUSR1") and threading.current_thread() is threading.main_thread():
+        signal.signal(signal.SIGUSR1, profiler.toggle)
 
     try:
-        while True:
-            prediction = scoring_runner.tick()
-            if prediction:
-                print(
-                    f"Decision: {prediction.decision.name} | "
-                    f"Disease: {prediction.predicted_disease} | "
-                    f"Confidence: {prediction.confidence:.2f}"
+        _scoring_loop(scoring_runner, should_stop, after_drain, metrics, wakeup, metrics_file, profiler)
+    finally:
+        profiler.stop()
+        metrics_file.remove()
+        if wakeup is not None:
+            wakeup.close()
+
+
+def _scoring_loop(scoring_runner, should_stop, after_drain, metrics, wakeup, metrics_file, profiler):
+    idle_sleep = IDLE_SLEEP_MIN
+
+    while not (should_stop and should_stop()):
+        profiler.poll()
+        started = time.perf_counter()
+        predictions = scoring_runner.drain(batch_size=BATCH_SIZE)
+        if metrics is not None and predictions:
+            metrics.record_scoring(time.perf_counter() - started, len(predictions))
+
+        for prediction in predictions:
+            print(
+                f"Decision: {prediction.decision.name} | "
+                f"Disease: {prediction.predicted_disease} | "
+                f"Confidence: {prediction.confidence:.2f}"
+            )
+
+        if after_drain is not None:
+            after_drain()
+        metrics_file.maybe_write()
+
+        # keep draining while there is work, back off only when idle
+        if predictions:
+            idle_sleep = IDLE_SLEEP_MIN
+        elif wakeup is not None:
+            woken = wakeup.wait(idle_sleep)
+            idle_sleep = IDLE_SLEEP_MIN if woken else min(idle_sleep * 2, IDLE_SLEEP_MAX)
+        else:
+            time.sleep(idle_sleep)
+            idle_sleep = min(idle_sleep * 2, IDLE_SLEEP_MAX)
+
+
+def build_retrain_service(classifier: DatasetClassifier, scoring_service=None) -> RetrainService:
+    """Retrain service starting from the active model version, if any."""
+    retrain_service = RetrainService(classifier, MODEL_VERSION, scoring_service)
+    if retrain_service.sync():
+        print(f"🧠 Loaded model {retrain_service.version.version}")
+    return retrain_service
+
+
+def make_housekeeping(
+    queue_service: DbQueueService,
+    retrain_runner: RetrainAgentRunner,
+    retrain_service: RetrainService
+):
+    """
+    Periodic lease reaper + retrain check, run once per loop iteration.
+    Retrains run on the retrain thread; a finished one is swapped in here,
+    between batches.
+    """
+    next_reap = 0.0
+    next_retrain_check = 0.0
+
+    def housekeeping():
+        nonlocal next_reap, next_retrain_check
+        now = time.monotonic()
+
+        if now >= next_reap:
+            requeued = queue_service.requeue_stale(LEASE_SECONDS)
+            if requeued:
+                print(f"♻️ Requeued {requeued} stale case(s)")
+            next_reap = now + REAP_INTERVAL
+
+        version = retrain_service.apply_pending()
+        if version is not None:
+            metrics = retrain_service.metrics.snapshot()
+            details = f"retrain {metrics['retrain_seconds_last']:.2f}s"
+            if metrics["scoring_retraining_batches"]:
+                details += (
+                    f", scoring {metrics['scoring_retraining_ms_per_case']:.2f} ms/case during retrain"
+                    f" vs {metrics['scoring_idle_ms_per_case']:.2f} otherwise"
                 )
+            print(f"🧠 Model {version.version} active ({details})")
 
+        if now >= next_retrain_check:
+            next_retrain_check = now + RETRAIN_CHECK_INTERVAL
             if retrain_runner.tick():
-                print("🔁 Retrain required")
-                learning_service.reset()
+                if retrain_service.retrain_in_background():
+                    print("🔁 Retrain required, retraining in background")
                 retrain_runner.reset()
 
-            time.sleep(2)
+    return housekeeping
+
+
+def make_model_sync(retrain_service: RetrainService):
+    """Picks up model versions trained by another process (see agent_supervisor)."""
+    next_sync = time.monotonic() + MODEL_SYNC_INTERVAL
+
+    def sync():
+        nonlocal next_sync
+        if time.monotonic() >= next_sync:
+            next_sync = time.monotonic() + MODEL_SYNC_INTERVAL
+            if retrain_service.sync():
+                print(f"🧠 Switched to model {retrain_service.version.version}")
+
+    return sync
+
+
+def run_agent():
+    init_db()
+
+    queue_service = DbQueueService()
+    learning_service = LearningService()
+
+    classifier = build_classifier(learning_service)
+
+    scoring_runner = build_scoring_runner(classifier, learning_service, queue_service)
+    retrain_service = build_retrain_service(classifier, scoring_runner.scoring_service)
+
+    retrain_runner = RetrainAgentRunner(
+        learning_service=learning_service,
+        rejection_threshold=0.3
+    )
+
+    print("🤖 Agent started")
+
+    housekeeping = make_housekeeping(queue_service, retrain_runner, retrain_service)
+
+    try:
+        run_scoring_loop(scoring_runner, after_drain=housekeeping, metrics=retrain_service.metrics)
     except KeyboardInterrupt:
         print("🛑 Agent stopped gracefully")
+    finally:
+        retrain_service.shutdown()
 
 
 if __name__ == "__main__":
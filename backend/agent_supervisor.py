@@ -0,0 +1,134 @@
+import argparse
+import multiprocessing as mp
+import os
+import signal
+import threading
+import time
+
+from storage.db import init_db
+from application.services.learning_service import LearningService
+from application.runners.retrain_runner import RetrainAgentRunner
+from application.services.db_queue_service import DbQueueService
+from agent_loop import (
+    build_classifier,
+    build_retrain_service,
+    build_scoring_runner,
+    make_housekeeping,
+    make_model_sync,
+    run_scoring_loop,
+)
+
+SUPERVISE_INTERVAL = 1.0
+SHUTDOWN_TIMEOUT = 10.0
+
+# Built once in the supervisor before forking, so every worker shares the
+# same index pages copy-on-write instead of parsing the CSV again.
+# Stays None under the "spawn" start method (also used for restarts once the
+# supervisor runs a retrain thread); workers then build their own.
+_classifier = None
+
+
+def _scoring_worker():
+    stopping = False
+
+    def request_stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+
+    # the supervisor owns Ctrl+C; SIGTERM finishes the current batch and exits
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, request_stop)
+
+    classifier = _classifier if _classifier is not None else build_classifier(LearningService())
+
+    scoring_runner = build_scoring_runner(classifier, classifier.learning_service, DbQueueService())
+
+    # the supervisor trains new versions; workers fold the same rows themselves
+    retrain_service = build_retrain_service(classifier, scoring_runner.scoring_service)
+
+    print(f"🤖 Scoring worker {os.getpid()} started")
+    run_scoring_loop(
+        scoring_runner,
+        should_stop=lambda: stopping,
+        after_drain=make_model_sync(retrain_service),
+        metrics=retrain_service.metrics,
+    )
+
+
+def run_supervisor(workers: int):
+    """
+    Runs `workers` scoring processes against the shared database, restarts
+    any that crash, and runs the single RetrainAgentRunner + lease reaper.
+    """
+    global _classifier
+
+    init_db()
+
+    ctx = mp.get_context("fork" if "fork" in mp.get_all_start_methods() else "spawn")
+
+    learning_service = LearningService()
+    classifier = build_classifier(learning_service)
+    if ctx.get_start_method() == "fork":
+        _classifier = classifier
+
+    queue_service = DbQueueService()
+    retrain_runner = RetrainAgentRunner(
+        learning_service=learning_service,
+        rejection_threshold=0.3
+    )
+
+    stopping = False
+
+    def request_stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGTERM, request_stop)
+    signal.signal(signal.SIGINT, request_stop)
+
+    def start_worker():
+        # forking while another thread (the retrain thread) may hold a lock
+        # can deadlock the child: once there is one, spawn fresh workers,
+        # which build their own classifier
+        context = ctx if threading.active_count() == 1 else mp.get_context("spawn")
+        process = context.Process(target=_scoring_worker, daemon=True)
+        process.start()
+        return process
+
+    processes = [start_worker() for _ in range(workers)]
+    print(f"🧭 Supervisor started with {workers} scoring worker(s)")
+
+    # workers pick up the versions trained here through make_model_sync
+    retrain_service = build_retrain_service(classifier)
+    housekeeping = make_housekeeping(queue_service, retrain_runner, retrain_service)
+
+    while not stopping:
+        for i, process in enumerate(processes):
+            if not process.is_alive() and not stopping:
+                print(f"⚠️ Worker {process.pid} exited ({process.exitcode}), restarting")
+                processes[i] = start_worker()
+
+        housekeeping()
+        time.sleep(SUPERVISE_INTERVAL)
+
+    retrain_service.shutdown()
+
+    # SIGTERM lets each worker finish its current batch; kill stragglers
+    for process in processes:
+        process.terminate()
+
+    deadline = time.monotonic() + SHUTDOWN_TIMEOUT
+    for process in processes:
+        process.join(max(0.0, deadline - time.monotonic()))
+        if process.is_alive():
+            process.kill()
+            process.join()
+
+    print("🛑 Supervisor stopped gracefully")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run several scoring agent workers.")
+    parser.add_argument("workers", nargs="?", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+    run_supervisor(args.workers)
@@ -1,48 +1,96 @@
-from typing import Optional, List
+from typing import Optional, List, Dict
 
-from domain.entities import Prediction
+from domain.entities import MedicalCase, Prediction, ScoredCase
 from application.services.scoring_service import ScoringService
 from application.services.db_queue_service import DbQueueService
+from application.services.agent_metrics import AgentMetrics
+from storage.db import statement_count
 
 
 class ScoringAgentRunner:
     """
     Agent runner:
     Sense -> Think -> Act
+
+    Each stage is timed into `metrics`, along with the SQL statements the
+    runner issues per scored case.
     """
 
-    def __init__(self, queue_service: DbQueueService, scoring_service: ScoringService):
+    def __init__(
+        self,
+        queue_service: DbQueueService,
+        scoring_service: ScoringService,
+        metrics: Optional[AgentMetrics] = None
+    ):
         self.queue_service = queue_service
         self.scoring_service = scoring_service
+        self.metrics = metrics if metrics is not None else AgentMetrics()
+
+    @staticmethod
+    def _status_payload(case: MedicalCase, scored: ScoredCase) -> Dict:
+        main_prediction = scored.prediction
+        return {
+            "case_id": case.id,
+            "disease": main_prediction.predicted_disease,
+            "confidence": main_prediction.confidence,
+            "decision": main_prediction.decision.name,
+            "predictions": [
+                {
+                    "disease": p.predicted_disease,
+                    "confidence": p.confidence,
+                    "decision": p.decision.name,
+                }
+                for p in scored.candidates
+            ],
+        }
 
     def tick(self) -> Optional[Prediction]:
+        statements = statement_count()
+
         # -------- SENSE --------
-        case = self.queue_service.dequeue_next()
+        with self.metrics.stage("sense"):
+            case = self.queue_service.dequeue_next()
         if case is None:
             return None
 
         # -------- THINK --------
-        predictions: List[Prediction] = self.scoring_service.score_top_k(case, k=5)
-        if not predictions:
-            # fallback
-            predictions = [self.scoring_service.score(case)]
+        with self.metrics.stage("think"):
+            # never empty: the classifier answers ("Unknown", 0.2) at worst
+            scored = self.scoring_service.score_top_k(case, k=5)
+
+        # -------- ACT --------
+        with self.metrics.stage("act"):
+            self.queue_service.update_status(**self._status_payload(case, scored))
+
+        self.metrics.record_batch(1, statement_count() - statements)
+        return scored.prediction
 
-        main_prediction = predictions[0]
+    def drain(self, batch_size: int = 64) -> List[Prediction]:
+        """
+        Drain-mode tick: claims up to `batch_size` cases, scores them together
+        and writes all results back at once. Returns the main predictions.
+        """
+        statements = statement_count()
+
+        # -------- SENSE --------
+        with self.metrics.stage("sense"):
+            cases = self.queue_service.dequeue_batch(batch_size)
+        if not cases:
+            return []
+
+        # -------- THINK --------
+        with self.metrics.stage("think"):
+            scored_batch = self.scoring_service.score_batch(cases, k=5)
+
+            payloads = []
+            main_predictions: List[Prediction] = []
+            for case, scored in zip(cases, scored_batch):
+                payloads.append(self._status_payload(case, scored))
+                main_predictions.append(scored.prediction)
 
         # -------- ACT --------
-        self.queue_service.update_status(
-            case_id=case.id,
-            disease=main_prediction.predicted_disease,
-            confidence=main_prediction.confidence,
-            decision=main_prediction.decision.name,
-            predictions=[
-                {
-                    "disease": p.predicted_disease,
-                    "confidence": p.confidence,
-                    "decision": p.decision.name,
-                }
-                for p in predictions
-            ],
-        )
+        with self.metrics.stage("act"):
+            self.queue_service.update_status_batch(payloads)
 
-        return main_prediction
+        self.metrics.record_batch(len(cases), statement_count() - statements)
+        return main_predictions
@@ -0,0 +1,267 @@
+import bisect
+import cProfile
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import storage.db
+
+# upper bounds (seconds) of the stage histogram buckets
+STAGE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+METRICS_WRITE_INTERVAL = 5.0
+# files of agents that stopped writing (crashed or killed) are dropped
+METRICS_STALE_SECONDS = 60.0
+
+# every metric family: name -> (type, help). Agent files and the API's
+# /metrics both render through this table, so merged output has one
+# HELP/TYPE header per family.
+FAMILIES = {
+    "medical_agent_stage_seconds": ("histogram", "Time spent in each runner stage (sense, think, act)."),
+    "medical_agent_batches_total": ("counter", "Runner calls that claimed at least one case."),
+    "medical_agent_cases_total": ("counter", "Cases scored."),
+    "medical_agent_sql_statements_total": (
+        "counter", "SQL statements (trigger programs included) run by the runner for scored cases."
+    ),
+    "medical_agent_sql_statements_per_case": ("gauge", "SQL statements per case in the last batch."),
+    "medical_agent_retrains_total": ("counter", "Model versions built by this process."),
+    "medical_agent_retrain_seconds_last": ("gauge", "Duration of the last retrain."),
+    "medical_queue_cases": ("gauge", "Cases waiting or in progress, by status."),
+    "medical_queue_oldest_age_seconds": ("gauge", "Age of the oldest queued case (0 when the queue is empty)."),
+}
+
+Sample = Tuple[str, str]  # (family, exposition line)
+
+
+def _labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels.items()) + "}"
+
+
+def sample(family: str, value, suffix: str = "", **labels) -> Sample:
+    return family, f"{family}{suffix}{_labels(labels)} {value}"
+
+
+def _family_of(name: str) -> Optional[str]:
+    if name in FAMILIES:
+        return name
+    for suffix in ("_bucket", "_sum", "_count"):
+        if name.endswith(suffix) and name[:-len(suffix)] in FAMILIES:
+            return name[:-len(suffix)]
+    return None
+
+
+def parse_samples(text: str) -> List[Sample]:
+    """Sample lines of a rendered file; comments and unknown metrics are skipped."""
+    samples = []
+    for line in text.splitlines():
+        if not line or line.startswith("#"):
+            continue
+        family = _family_of(line.split("{", 1)[0].split(" ", 1)[0])
+        if family is not None:
+            samples.append((family, line))
+    return samples
+
+
+def render(samples: Iterable[Sample]) -> str:
+    """Prometheus text format, grouped by family in FAMILIES order."""
+    by_family: Dict[str, List[str]] = {}
+    for family, line in samples:
+        by_family.setdefault(family, []).append(line)
+
+    lines = []
+    for family, (kind, help_text) in FAMILIES.items():
+        if family in by_family:
+            lines.append(f"# HELP {family} {help_text}")
+            lines.append(f"# TYPE {family} {kind}")
+            lines.extend(by_family[family])
+    return "\n".join(lines) + "\n"
+
+
+class AgentMetrics:
+    """Stage timings and SQL counters of one scoring runner."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # stage -> [per-bucket counts (+Inf last), count, seconds]
+        self._stages = {}
+        self.batches = 0
+        self.cases = 0
+        self.sql_statements = 0
+        self.sql_statements_per_case = 0.0
+
+    @contextmanager
+    def stage(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe_stage(name, time.perf_counter() - started)
+
+    def observe_stage(self, name: str, seconds: float):
+        with self._lock:
+            stage = self._stages.get(name)
+            if stage is None:
+                stage = self._stages[name] = [[0] * (len(STAGE_BUCKETS) + 1), 0, 0.0]
+            stage[0][bisect.bisect_left(STAGE_BUCKETS, seconds)] += 1
+            stage[1] += 1
+            stage[2] += seconds
+
+    def record_batch(self, cases: int, statements: int):
+        with self._lock:
+            self.batches += 1
+            self.cases += cases
+            self.sql_statements += statements
+            self.sql_statements_per_case = statements / cases
+
+    def samples(self, **labels) -> List[Sample]:
+        with self._lock:
+            result = []
+            for name, (buckets, count, seconds) in self._stages.items():
+                cumulative = 0
+                for bound, hits in zip(STAGE_BUCKETS + ("+Inf",), buckets):
+                    cumulative += hits
+                    result.append(sample(
+                        "medical_agent_stage_seconds", cumulative, "_bucket", **labels, stage=name, le=bound
+                    ))
+                result.append(sample("medical_agent_stage_seconds", f"{seconds:.6f}", "_sum", **labels, stage=name))
+                result.append(sample("medical_agent_stage_seconds", count, "_count", **labels, stage=name))
+
+            result.append(sample("medical_agent_batches_total", self.batches, **labels))
+            result.append(sample("medical_agent_cases_total", self.cases, **labels))
+            result.append(sample("medical_agent_sql_statements_total", self.sql_statements, **labels))
+            result.append(sample(
+                "medical_agent_sql_statements_per_case", f"{self.sql_statements_per_case:.2f}", **labels
+            ))
+            return result
+
+
+# -------------------------------------------------
+# METRICS FILES
+# -------------------------------------------------
+
+def metrics_dir() -> Path:
+    """One directory per database, next to it (e.g. storage/medical.metrics/)."""
+    db_path = Path(storage.db.DB_PATH)
+    return db_path.with_name(db_path.stem + ".metrics")
+
+
+class MetricsFile:
+    """
+    Writes an agent's metrics to <metrics_dir>/agent-<pid>.prom at most
+    every METRICS_WRITE_INTERVAL seconds (atomic replace, so readers never
+    see half a file). The API's /metrics merges all of them; the directory
+    also works as a node_exporter textfile collector directory.
+    """
+
+    def __init__(self, agent_metrics: AgentMetrics, retrain_metrics=None):
+        self.agent_metrics = agent_metrics
+        self.retrain_metrics = retrain_metrics
+        self.path = metrics_dir() / f"agent-{os.getpid()}.prom"
+        self._next_write = 0.0
+
+    def samples(self) -> List[Sample]:
+        agent = str(os.getpid())
+        samples = self.agent_metrics.samples(agent=agent)
+        if self.retrain_metrics is not None:
+            retrain = self.retrain_metrics.snapshot()
+            samples.append(sample("medical_agent_retrains_total", retrain["retrains"], agent=agent))
+            samples.append(sample(
+                "medical_agent_retrain_seconds_last", f"{retrain['retrain_seconds_last']:.3f}", agent=agent
+            ))
+        return samples
+
+    def maybe_write(self):
+        now = time.monotonic()
+        if now >= self._next_write:
+            self._next_write = now + METRICS_WRITE_INTERVAL
+            self.write()
+
+    def write(self):
+        try:
+            self.path.parent.mkdir(exist_ok=True)
+            tmp_path = self.path.with_suffix(".tmp")
+            tmp_path.write_text(render(self.samples()), encoding="utf-8")
+            os.replace(tmp_path, self.path)
+        except OSError as error:
+            print(f"⚠️ Could not write metrics: {error}")
+
+    def remove(self):
+        try:
+            self.path.unlink()
+        except OSError:
+            pass
+
+
+def read_agent_samples() -> List[Sample]:
+    """Samples from every live agent's metrics file; stale files are deleted."""
+    samples = []
+    now = time.time()
+    for path in sorted(metrics_dir().glob("agent-*.prom")):
+        try:
+            if now - path.stat().st_mtime > METRICS_STALE_SECONDS:
+                path.unlink()
+                continue
+            samples.extend(parse_samples(path.read_text(encoding="utf-8")))
+        except OSError:
+            continue  # replaced or removed while reading
+    return samples
+
+
+# -------------------------------------------------
+# PROFILING
+# -------------------------------------------------
+
+class AgentProfiler:
+    """
+    cProfile around the scoring loop, switched on and off at runtime (SIGUSR1
+    in agent_loop) or on from the start with AGENT_PROFILE=1. Each stop dumps
+    the collected stats to <metrics_dir>/agent-<pid>-<time>.prof, readable
+    with `python -m pstats` or snakeviz.
+
+    toggle() only flags the request; poll(), called between batches, does the
+    switch, so a signal handler never starts or stops the profiler mid-call.
+    """
+
+    def __init__(self, enabled: bool = False):
+        self._profile: Optional[cProfile.Profile] = None
+        self._toggle_requested = enabled
+
+    @property
+    def running(self) -> bool:
+        return self._profile is not None
+
+    def toggle(self, *_):
+        self._toggle_requested = True
+
+    def poll(self):
+        if self._toggle_requested:
+            self._toggle_requested = False
+            if self._profile is None:
+                self.start()
+            else:
+                self.stop()
+
+    def start(self):
+        self._profile = cProfile.Profile()
+        self._profile.enable()
+        print(f"🔬 Profiling agent {os.getpid()}")
+
+    def stop(self):
+        profile, self._profile = self._profile, None
+        if profile is None:
+            return
+
+        profile.disable()
+        directory = metrics_dir()
+        try:
+            directory.mkdir(exist_ok=True)
+            path = directory / f"agent-{os.getpid()}-{int(time.time())}.prof"
+            profile.dump_stats(str(path))
+            print(f"🔬 Profile written to {path}")
+        except OSError as error:
+            print(f"⚠️ Could not write profile: {error}")
@@ -0,0 +1,121 @@
+import asyncio
+import time
+from typing import Dict, Optional, Set
+
+from storage import async_db
+from storage.db import case_events_after, data_version, max_case_event_id, prune_case_events
+
+POLL_INTERVAL = 0.02
+PRUNE_INTERVAL = 60.0
+EVENT_RETENTION = 300.0
+EVENT_BATCH = 1000
+
+
+class CaseNotifier:
+    """
+    Wakes API requests waiting for a case result.
+
+    The agent runs in another process, so results arrive through the
+    case_events change feed. A single task per API process checks
+    PRAGMA data_version every `poll_interval` seconds while anyone is
+    waiting and only reads case_events when the database has changed,
+    however many clients are connected.
+    """
+
+    def __init__(self, poll_interval: float = POLL_INTERVAL):
+        self.poll_interval = poll_interval
+        self._waiters: Dict[int, Set[asyncio.Future]] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task: Optional[asyncio.Task] = None
+        self._ready: Optional[asyncio.Future] = None  # done once _last_id is set
+        self._last_id = 0
+
+    async def subscribe(self, case_id: int) -> asyncio.Future:
+        """
+        Future resolved on the case's next diagnosis event; pair with
+        unsubscribe. Returns once the feed position is known, so any
+        diagnosis written after the caller's next read of the case is seen.
+        """
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # first use, or a new event loop (e.g. app restarted in tests)
+            self._loop = loop
+            self._waiters = {}
+            self._task = None
+
+        if self._task is None or self._task.done():
+            self._ready = loop.create_future()
+            self._task = loop.create_task(self._run(self._ready))
+
+        # shielded: a cancelled caller must not cancel it for the others
+        await asyncio.shield(self._ready)
+
+        future = loop.create_future()
+        self._waiters.setdefault(case_id, set()).add(future)
+        return future
+
+    def unsubscribe(self, case_id: int, future: asyncio.Future):
+        waiters = self._waiters.get(case_id)
+        if waiters is not None:
+            waiters.discard(future)
+            if not waiters:
+                del self._waiters[case_id]
+
+    async def wait(self, future: asyncio.Future, timeout: float) -> bool:
+        """True if the event arrived within timeout seconds."""
+        try:
+            await asyncio.wait_for(future, timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def _notify(self, case_id: int, status: str):
+        for future in self._waiters.pop(case_id, ()):
+            if not future.done():
+                future.set_result(status)
+
+    async def _run(self, ready: asyncio.Future):
+        # only events after startup matter; waiters re-check the case row
+        try:
+            self._last_id = await async_db.run_feed(max_case_event_id)
+        except BaseException as error:
+            if isinstance(error, Exception):
+                ready.set_exception(error)
+            else:
+                ready.cancel()
+            raise
+        ready.set_result(None)
+
+        version = None
+        next_prune = time.monotonic() + PRUNE_INTERVAL
+
+        while True:
+            if self._waiters:
+                current = await async_db.run_feed(data_version)
+                if current != version:
+                    version = current
+                    await self._read_events()
+
+            if time.monotonic() >= next_prune:
+                next_prune = time.monotonic() + PRUNE_INTERVAL
+                await async_db.run_feed(prune_case_events, EVENT_RETENTION)
+
+            await asyncio.sleep(self.poll_interval)
+
+    async def _read_events(self):
+        while True:
+            events = await async_db.run_feed(case_events_after, self._last_id, EVENT_BATCH)
+            for event_id, case_id, status in events:
+                self._last_id = event_id
+                self._notify(case_id, status)
+            if len(events) < EVENT_BATCH:
+                return
@@ -1,9 +1,20 @@
-import csv
+import threading
 from collections import Counter, defaultdict
-from typing import List, Tuple
+from typing import Dict, List, Optional, Set, Tuple
 
 from domain.entities import MedicalCase
 from application.services.learning_service import LearningService
+from application.services import index_snapshot, score_table
+from application.services.dataset_ingestion import ingest_file
+from application.services.symptom_matrix import NUMPY_AVAILABLE, SymptomMatrix
+from application.services.prediction_cache import PredictionCache
+from storage.db import disease_key, symptom_key
+
+# count added per accepted feedback row, per symptom, when retraining
+FEEDBACK_WEIGHT = 1
+
+# stored symptom mask -> score table mask, for this many distinct sets
+TABLE_MASK_MEMO = 65536
 
 
 class DatasetClassifier:
@@ -14,31 +25,181 @@ class DatasetClassifier:
 
 
 class DatasetClassifier:
-    def __init__(self, csv_path: str, learning_service):
+    def __init__(
+        self,
+        csv_path: str,
+        learning_service,
+        vectorized: bool = False,
+        snapshot: bool = False,
+        index_path: Optional[str] = None,
+        precompute: int = 0
+    ):
         self.learning_service = learning_service
+        self.vectorized = vectorized
         self.symptom_to_diseases = defaultdict(Counter)  # symptom -> Counter(disease -> freq)
+
+        # the snapshot is a NumPy memory map; without numpy parse the CSV.
+        # index_path points at a prebuilt index from ingest_dataset.py.
+        matrix = None
+        if index_path and NUMPY_AVAILABLE:
+            matrix = index_snapshot.load_snapshot(index_path)
+        if matrix is None and snapshot and NUMPY_AVAILABLE:
+            matrix = self._load_snapshot(csv_path)
+        if matrix is None:
+            self._load(csv_path)
+        else:
+            self.symptom_to_diseases = matrix.to_counters()
+
+        # optional NumPy engine, same results as the dict-based path below
+        if vectorized and matrix is None:
+            matrix = SymptomMatrix.from_counters(self.symptom_to_diseases)
+        self._matrix = matrix if vectorized else None
+
+        # optional base top-k of every combination of up to `precompute`
+        # symptoms, persisted next to the index (see score_table)
+        self._precompute = precompute if NUMPY_AVAILABLE else 0
+        self._table = None
+        self._table_building = False
+        self._table_masks: Dict[int, Optional[int]] = {}
+        if self._precompute:
+            self._table = self._load_table(
+                matrix, precompute, index_path or index_snapshot.snapshot_path_for(csv_path)
+            )
+
+        self.prediction_cache = PredictionCache(getattr(learning_service, "cache", None))
+
+    @classmethod
+    def from_counters(
+        cls,
+        symptom_to_diseases,
+        learning_service,
+        vectorized: bool = False,
+        precompute: int = 0
+    ) -> "DatasetClassifier":
+        """
+        Classifier over an already built index (no CSV read). Its score table
+        is built in the background once it first scores (see _current_table).
+        """
+        classifier = cls.__new__(cls)
+        classifier.learning_service = learning_service
+        classifier.vectorized = vectorized
+        classifier.symptom_to_diseases = symptom_to_diseases
+        classifier._matrix = SymptomMatrix.from_counters(symptom_to_diseases) if vectorized else None
+        classifier._precompute = precompute if NUMPY_AVAILABLE else 0
+        classifier._table = None
+        classifier._table_building = False
+        classifier._table_masks = {}
+        classifier.prediction_cache = PredictionCache(getattr(learning_service, "cache", None))
+        return classifier
+
+    def with_feedback(self, rows, weight: int = FEEDBACK_WEIGHT) -> "DatasetClassifier":
+        """
+        New classifier with accepted feedback rows (id, symptoms, disease)
+        folded into a copy of this index as `weight` counts per symptom.
+        This classifier is left untouched so it can keep serving meanwhile.
+        """
+        counters = defaultdict(Counter)
+        for symptom, diseases in self.symptom_to_diseases.items():
+            counters[symptom] = Counter(diseases)
+
+        # feedback stores the disease as typed; reuse the dataset's spelling
+        names = {}
+        for diseases in counters.values():
+            for disease in diseases:
+                names.setdefault(disease_key(disease), disease)
+
+        for _, symptoms, disease in rows:
+            name = names.setdefault(disease_key(disease), disease.strip())
+            for symptom in self._input_symptoms(symptoms):
+                counters[symptom][name] += weight
+
+        return self.from_counters(counters, self.learning_service, self.vectorized, self._precompute)
+
+    def _load_snapshot(self, csv_path: str) -> Optional[SymptomMatrix]:
+        """
+        Loads the compiled index from its memory-mapped snapshot, rebuilding
+        the snapshot from the CSV when it is missing or stale.
+        """
+        source_hash = index_snapshot.file_sha256(csv_path)
+        snapshot_path = index_snapshot.snapshot_path_for(csv_path)
+
+        matrix = index_snapshot.load_snapshot(snapshot_path, source_hash)
+        if matrix is not None:
+            return matrix
+
         self._load(csv_path)
+        matrix = SymptomMatrix.from_counters(self.symptom_to_diseases)
+        try:
+            index_snapshot.save_snapshot(snapshot_path, matrix, source_hash)
+        except OSError:
+            pass  # read-only location: keep working from the CSV
+        return matrix
 
-    def _load(self, path: str):
-        with open(path, newline="", encoding="utf-8") as f:
-            reader = csv.DictReader(f)
+    def _load_table(self, matrix: Optional[SymptomMatrix], max_size: int, index_path: str):
+        """Loads the precomputed table, rebuilding it when missing or stale."""
+        if matrix is None:
+            matrix = SymptomMatrix.from_counters(self.symptom_to_diseases)
 
-            for row in reader:
-                symptoms_raw = row.get("Simptomi", "").lower().strip()
-                disease = row.get("Bolest", "").strip()
+        table_path = score_table.table_path_for(index_path)
+        table = score_table.load_table(table_path, matrix, max_size)
+        if table is not None:
+            return table
 
-                if not symptoms_raw or not disease:
-                    continue
+        table = score_table.ScoreTable.build(matrix, max_size)
+        try:
+            score_table.save_table(table_path, table)
+        except OSError:
+            pass  # read-only location: keep the table in memory
+        return table
 
-                symptoms_list = [s.strip() for s in symptoms_raw.split(",") if s.strip()]
-                for symptom in symptoms_list:
-                    self.symptom_to_diseases[symptom][disease] += 1
+    def _load(self, path: str):
+        ingest_file(path, into=self.symptom_to_diseases)
 
+    def symptoms_by_frequency(self) -> List[str]:
+        """Known symptoms, the most frequent first (see storage.db.register_symptoms)."""
+        return sorted(
+            self.symptom_to_diseases,
+            key=lambda symptom: (-sum(self.symptom_to_diseases[symptom].values()), symptom)
+        )
 
+    def _current_table(self):
+        """
+        The score table, or None. On a retrained classifier the first call
+        starts building it on a thread; scoring uses the matrix until then,
+        and builds that never serve never build a table.
+        """
+        table = self._table
+        if table is None and self._precompute and not self._table_building:
+            self._table_building = True
+            threading.Thread(target=self._build_table, name="score-table", daemon=True).start()
+        return table
 
-    @staticmethod
-    def _split_set(symptoms: str) -> set:
-        return {s.strip() for s in symptoms.lower().split(",") if s.strip()}
+    def _build_table(self):
+        try:
+            matrix = self._matrix
+            if matrix is None:
+                matrix = SymptomMatrix.from_counters(self.symptom_to_diseases)
+            self._table = score_table.ScoreTable.build(matrix, self._precompute)
+        except Exception as error:
+            print(f"❌ Score table build failed: {error}")
+
+    def _table_top_k(self, table, case, trust: float, k: int, rejected: Set[str]):
+        """Score table result, or None when the table cannot answer."""
+        if case.symptom_mask is None:
+            table_mask = table.mask_for(self._input_symptoms(case.symptoms))
+        else:
+            # stored cases carry their symptom bitmask: parsed once per set.
+            # Their text is stored normalized, i.e. already in table order.
+            table_mask = self._table_masks.get(case.symptom_mask, -1)
+            if table_mask == -1:
+                table_mask = table.mask_for(self._input_symptoms(case.symptoms))
+                if len(self._table_masks) >= TABLE_MASK_MEMO:
+                    self._table_masks.clear()
+                self._table_masks[case.symptom_mask] = table_mask
+
+        if table_mask is None:
+            return None
+        return table.top_k_for_mask(table_mask, trust, k, rejected)
 
     def predict(self, case: MedicalCase, trust: float = 0.5) -> Tuple[str, float]:
         results = self.predict_top_k(case, trust, k=1)
@@ -46,16 +207,64 @@ class DatasetClassifier:
             return "Unknown", 0.2
         return results[0]
 
-    def predict_top_k(self, case, trust: float, k: int = 5) -> List[Tuple[str, float]]:
-        input_symptoms = [s.strip() for s in case.symptoms.lower().split(",") if s.strip()]
+    @staticmethod
+    def _input_symptoms(symptoms: str) -> List[str]:
+        return [s.strip() for s in symptoms.lower().split(",") if s.strip()]
+
+    def predict_top_k(
+        self,
+        case,
+        trust: float,
+        k: int = 5,
+        feedback_stats: Optional[Dict[str, Tuple[int, int]]] = None
+    ) -> List[Tuple[str, float]]:
+        key = (case.symptoms, k, trust)
+        results = self.prediction_cache.get(key)
+        if results is None:
+            results = self._predict_top_k(case, trust, k, feedback_stats)
+            self.prediction_cache.put(key, symptom_key(case.symptoms, case.symptom_mask), results)
+        return list(results)
+
+    def _predict_top_k(
+        self,
+        case,
+        trust: float,
+        k: int,
+        feedback_stats: Optional[Dict[str, Tuple[int, int]]]
+    ) -> List[Tuple[str, float]]:
+        # one feedback lookup per case instead of one per (symptom, disease)
+        rejected = self.learning_service.rejected_diseases_for_symptoms(
+            case.symptoms, stats=feedback_stats, symptom_mask=case.symptom_mask
+        )
+
+        table = self._current_table()
+        if table is not None:
+            results = self._table_top_k(table, case, trust, k, rejected)
+            if results is not None:
+                return results
+
+        input_symptoms = self._input_symptoms(case.symptoms)
         if not input_symptoms:
             return [("Unknown", 0.2)]
 
+        if self._matrix is not None:
+            results = self._matrix.top_k(input_symptoms, trust, k, rejected)
+            return results if results is not None else [("Unknown", 0.2)]
+
+        return self._dict_top_k(input_symptoms, trust, k, rejected)
+
+    def _dict_top_k(
+        self,
+        input_symptoms: List[str],
+        trust: float,
+        k: int,
+        rejected: Set[str]
+    ) -> List[Tuple[str, float]]:
         disease_score = Counter()
 
         for symptom in input_symptoms:
             for disease, freq in self.symptom_to_diseases.get(symptom, {}).items():
-                if self.learning_service.is_disease_rejected_for_symptoms(case.symptoms, disease):
+                if disease.lower() in rejected:
                     continue
                 disease_score[disease] += freq
 
@@ -86,4 +295,72 @@ class DatasetClassifier:
         results.sort(key=lambda x: x[1], reverse=True)
         return results[:k]
 
+    def score_batch(
+        self,
+        cases: List[MedicalCase],
+        k: int = 5,
+        trust: float = 0.0,
+        feedback_stats: Optional[List[Dict[str, Tuple[int, int]]]] = None
+    ) -> List[List[Tuple[str, float]]]:
+        """predict_top_k for many cases; feedback_stats is aligned with cases."""
+        results: List[Optional[List[Tuple[str, float]]]] = [
+            self.prediction_cache.get((case.symptoms, k, trust)) for case in cases
+        ]
+
+        misses = [i for i, result in enumerate(results) if result is None]
+        if misses:
+            miss_cases = [cases[i] for i in misses]
+            if feedback_stats is None:
+                miss_stats = self.learning_service.feedback_stats_by_disease_batch(
+                    [case.symptoms for case in miss_cases],
+                    [case.symptom_mask for case in miss_cases]
+                )
+            else:
+                miss_stats = [feedback_stats[i] for i in misses]
+
+            for i, case, result in zip(misses, miss_cases, self._score_batch(miss_cases, k, trust, miss_stats)):
+                self.prediction_cache.put(
+                    (case.symptoms, k, trust), symptom_key(case.symptoms, case.symptom_mask), result
+                )
+                results[i] = result
+
+        return [list(result) for result in results]
+
+    def _score_batch(
+        self,
+        cases: List[MedicalCase],
+        k: int,
+        trust: float,
+        feedback_stats: List[Dict[str, Tuple[int, int]]]
+    ) -> List[List[Tuple[str, float]]]:
+        results: List[List[Tuple[str, float]]] = [[("Unknown", 0.2)]] * len(cases)
+        table = self._current_table()
+        indices, symptom_lists, rejected_list = [], [], []
+        for i, (case, stats) in enumerate(zip(cases, feedback_stats)):
+            rejected = self.learning_service.rejected_diseases_for_symptoms(
+                case.symptoms, stats=stats, symptom_mask=case.symptom_mask
+            )
+
+            if table is not None:
+                looked_up = self._table_top_k(table, case, trust, k, rejected)
+                if looked_up is not None:
+                    results[i] = looked_up
+                    continue
+
+            input_symptoms = self._input_symptoms(case.symptoms)
+            if not input_symptoms:
+                continue
+
+            indices.append(i)
+            symptom_lists.append(input_symptoms)
+            rejected_list.append(rejected)
+
+        if self._matrix is None:
+            for i, input_symptoms, rejected in zip(indices, symptom_lists, rejected_list):
+                results[i] = self._dict_top_k(input_symptoms, trust, k, rejected)
+            return results
 
+        scored = self._matrix.top_k_batch(symptom_lists, trust, k, rejected_list)
+        for i, result in zip(indices, scored):
+            results[i] = result if result is not None else [("Unknown", 0.2)]
+        return results
@@ -0,0 +1,191 @@
+import csv
+import json
+import os
+from collections import Counter, defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+SYMPTOMS_FIELD = "Simptomi"
+DISEASE_FIELD = "Bolest"
+CHUNK_ROWS = 50_000
+
+# progress(path, rows_done, bytes_done, total_bytes)
+ProgressCallback = Callable[[str, int, int, int], None]
+
+SymptomIndex = Dict[str, Counter]
+
+
+def _count_rows(rows: Iterable[Tuple[str, str]]) -> SymptomIndex:
+    """Partial symptom -> Counter(disease) for (raw symptoms, disease) pairs."""
+    counts: SymptomIndex = defaultdict(Counter)
+    for symptoms_raw, disease in rows:
+        symptoms_raw = (symptoms_raw or "").lower().strip()
+        disease = (disease or "").strip()
+
+        if not symptoms_raw or not disease:
+            continue
+
+        for symptom in symptoms_raw.split(","):
+            symptom = symptom.strip()
+            if symptom:
+                counts[symptom][disease] += 1
+    return counts
+
+
+def _count_jsonl_lines(lines: List[str], symptoms_field: str, disease_field: str) -> SymptomIndex:
+    rows = []
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        record = json.loads(line)
+        symptoms = record.get(symptoms_field, "")
+        if isinstance(symptoms, list):
+            symptoms = ",".join(symptoms)
+        rows.append((symptoms, record.get(disease_field, "")))
+    return _count_rows(rows)
+
+
+def merge_into(target: SymptomIndex, partial: SymptomIndex):
+    """Adds partial counts; merging chunks in file order keeps first-seen order."""
+    for symptom, counter in partial.items():
+        target[symptom].update(counter)
+
+
+def _read_lines(path: str, position: List[int]) -> Iterator[str]:
+    # byte-counting line reader, so progress works while csv.reader iterates
+    with open(path, "rb") as f:
+        for raw in f:
+            position[0] += len(raw)
+            yield raw.decode("utf-8-sig" if position[0] == len(raw) else "utf-8")
+
+
+def _iter_chunks(
+    path: str,
+    file_format: str,
+    symptoms_field: str,
+    disease_field: str,
+    chunk_rows: int,
+    position: List[int]
+):
+    """Yields (worker function, args, rows in chunk) without loading the whole file."""
+    lines = _read_lines(path, position)
+
+    if file_format == "jsonl":
+        chunk: List[str] = []
+        for line in lines:
+            chunk.append(line)
+            if len(chunk) >= chunk_rows:
+                yield _count_jsonl_lines, (chunk, symptoms_field, disease_field), len(chunk)
+                chunk = []
+        if chunk:
+            yield _count_jsonl_lines, (chunk, symptoms_field, disease_field), len(chunk)
+        return
+
+    reader = csv.reader(lines)
+    header = next(reader, None)
+    if header is None:
+        return
+    try:
+        symptoms_col = header.index(symptoms_field)
+        disease_col = header.index(disease_field)
+    except ValueError:
+        raise ValueError(f"{path}: expected columns {symptoms_field!r} and {disease_field!r}")
+    width = max(symptoms_col, disease_col) + 1
+
+    pairs: List[Tuple[str, str]] = []
+    for row in reader:
+        if len(row) < width:
+            continue
+        pairs.append((row[symptoms_col], row[disease_col]))
+        if len(pairs) >= chunk_rows:
+            yield _count_rows, (pairs,), len(pairs)
+            pairs = []
+    if pairs:
+        yield _count_rows, (pairs,), len(pairs)
+
+
+def detect_format(path: str) -> str:
+    return "jsonl" if path.lower().endswith((".jsonl", ".ndjson")) else "csv"
+
+
+def ingest_file(
+    path: str,
+    into: Optional[SymptomIndex] = None,
+    workers: int = 1,
+    chunk_rows: int = CHUNK_ROWS,
+    symptoms_field: str = SYMPTOMS_FIELD,
+    disease_field: str = DISEASE_FIELD,
+    file_format: Optional[str] = None,
+    progress: Optional[ProgressCallback] = None,
+    executor: Optional[ProcessPoolExecutor] = None
+) -> SymptomIndex:
+    """
+    Streams a CSV or JSONL file into a symptom -> Counter(disease) index.
+
+    The file is read in chunks of `chunk_rows` rows. With workers > 1 the
+    chunks are counted in worker processes, with at most 2 chunks per worker
+    in flight, so memory stays flat regardless of file size. Partial counters
+    are merged in file order, so the result (including insertion order) is
+    identical to a sequential pass.
+    """
+    index: SymptomIndex = into if into is not None else defaultdict(Counter)
+    file_format = file_format or detect_format(path)
+    total_bytes = os.path.getsize(path)
+    position = [0]
+    rows_done = 0
+
+    chunks = _iter_chunks(path, file_format, symptoms_field, disease_field, chunk_rows, position)
+
+    if workers <= 1 and executor is None:
+        for func, args, n_rows in chunks:
+            merge_into(index, func(*args))
+            rows_done += n_rows
+            if progress:
+                progress(path, rows_done, position[0], total_bytes)
+        return index
+
+    own_executor = executor is None
+    pool = executor or ProcessPoolExecutor(max_workers=workers)
+    max_in_flight = 2 * (workers if own_executor else max(1, pool._max_workers))
+    in_flight = deque()
+
+    try:
+        def drain_one():
+            nonlocal rows_done
+            future, n_rows = in_flight.popleft()
+            merge_into(index, future.result())
+            rows_done += n_rows
+            if progress:
+                progress(path, rows_done, position[0], total_bytes)
+
+        for func, args, n_rows in chunks:
+            in_flight.append((pool.submit(func, *args), n_rows))
+            if len(in_flight) >= max_in_flight:
+                drain_one()
+        while in_flight:
+            drain_one()
+    finally:
+        if own_executor:
+            pool.shutdown(cancel_futures=True)
+
+    return index
+
+
+def ingest_files(
+    paths: List[str],
+    into: Optional[SymptomIndex] = None,
+    workers: int = 1,
+    **kwargs
+) -> SymptomIndex:
+    """ingest_file for several files in order, sharing one worker pool."""
+    index: SymptomIndex = into if into is not None else defaultdict(Counter)
+    if workers <= 1:
+        for path in paths:
+            ingest_file(path, into=index, **kwargs)
+        return index
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for path in paths:
+            ingest_file(path, into=index, workers=workers, executor=pool, **kwargs)
+    return index
@@ -1,30 +1,59 @@
+import os
+import socket
 from typing import Optional, List, Dict
 from datetime import datetime, timezone
 
 from domain.entities import MedicalCase
 from domain.enums import CaseStatus
-from storage.db import fetch_next_queued_case, update_case_status
+from storage.db import (
+    fetch_next_queued_case,
+    fetch_queued_cases,
+    requeue_stale_cases,
+    update_case_status,
+    update_case_statuses,
+)
+
+# status column value (the member name) -> member, without the Enum lookup
+_STATUS_BY_NAME = {status.name: status for status in CaseStatus}
 
 
 class DbQueueService:
     """QueueService backed by SQLite."""
 
-    def dequeue_next(self) -> Optional[MedicalCase]:
-        row = fetch_next_queued_case()
-        if row is None:
-            return None
+    def __init__(self, worker_id: Optional[str] = None):
+        # identifies this agent process on the rows it claims
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
 
-        case_id, age, gender, symptoms, status = row
+    @staticmethod
+    def _to_case(row, created_at: datetime) -> MedicalCase:
+        case_id, age, gender, symptoms, status, symptom_mask = row
 
         return MedicalCase(
             id=case_id,
             age=age,
             gender=gender,
             symptoms=symptoms,
-            status=CaseStatus[status],
-            created_at=datetime.now(timezone.utc),
+            status=_STATUS_BY_NAME[status],
+            created_at=created_at,
+            symptom_mask=symptom_mask,
         )
 
+    def dequeue_next(self) -> Optional[MedicalCase]:
+        row = fetch_next_queued_case(self.worker_id)
+        if row is None:
+            return None
+
+        return self._to_case(row, datetime.now(timezone.utc))
+
+    def dequeue_batch(self, limit: int) -> List[MedicalCase]:
+        """Claims up to `limit` queued cases in one transaction."""
+        created_at = datetime.now(timezone.utc)  # one timestamp per claim
+        return [self._to_case(row, created_at) for row in fetch_queued_cases(limit, self.worker_id)]
+
+    def requeue_stale(self, lease_seconds: float) -> int:
+        """Requeues cases stuck in PROCESSING after their lease expired."""
+        return requeue_stale_cases(lease_seconds)
+
     def update_status(
         self,
         case_id: int,
@@ -38,5 +67,11 @@ class DbQueueService:
             disease=disease,
             confidence=confidence,
             decision=decision,
-            predictions=predictions
+            predictions=predictions,
+            worker_id=self.worker_id
         )
+
+    def update_status_batch(self, results: List[Dict]):
+        """Writes many update_status payloads in a single statement batch."""
+        if results:
+            update_case_statuses(results, self.worker_id)
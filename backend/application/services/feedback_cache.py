@@ -0,0 +1,178 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, List, Optional, Set, Tuple
+
+from storage.db import (
+    feedback_rows_after,
+    feedback_stats_snapshot,
+    max_feedback_id,
+    normalize_symptoms,
+    symptom_key,
+)
+
+DiseaseStats = Dict[str, Tuple[int, int]]
+
+
+class FeedbackCache:
+    """
+    In-memory (symptom key -> disease_key -> (accepted, rejected)) map.
+    Symptom sets are keyed by storage.db.symptom_key: the stored bitmask
+    when the caller has one, so lookups for queued cases parse no strings.
+
+    Symptom sets are loaded from the aggregate tables on first use and then
+    kept current by reading only feedback rows newer than the last seen id,
+    at most once per `refresh_interval` seconds. Rarely used symptom sets
+    are evicted LRU once `max_entries` is reached.
+
+    Listeners are called with the symptom keys touched by new feedback
+    (or None after clear()), e.g. to invalidate prediction caches.
+    """
+
+    def __init__(self, max_entries: int = 4096, refresh_interval: float = 1.0):
+        self.max_entries = max_entries
+        self.refresh_interval = refresh_interval
+
+        # symptom key -> (feedback id the entry is current up to, stats)
+        self._entries: "OrderedDict[Hashable, Tuple[int, DiseaseStats]]" = OrderedDict()
+        self._last_id: Optional[int] = None
+        self._next_refresh = 0.0
+        self._lock = threading.Lock()
+        self._listeners: List[Callable[[Optional[Set[Hashable]]], None]] = []
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.refreshes = 0
+
+    def add_listener(self, listener: Callable[[Optional[Set[Hashable]]], None]):
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener: Callable[[Optional[Set[Hashable]]], None]):
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def _notify(self, touched: Optional[Set[Hashable]]):
+        # called without holding the lock so listeners may use their own locks
+        if touched is None or touched:
+            for listener in self._listeners:
+                listener(touched)
+
+    def poll(self):
+        """Refreshes if refresh_interval has passed since the last refresh."""
+        with self._lock:
+            touched = self._maybe_refresh()
+        self._notify(touched)
+
+    def get(self, symptoms: str, mask: Optional[int] = None) -> DiseaseStats:
+        return self.get_many([symptoms], [mask])[0]
+
+    def get_many(
+        self,
+        symptoms_list: List[str],
+        masks: Optional[List[Optional[int]]] = None
+    ) -> List[DiseaseStats]:
+        """Per-disease stats for each symptom set, in input order. `masks` are stored masks, if known."""
+        if masks is None:
+            masks = [None] * len(symptoms_list)
+        keys = [symptom_key(symptoms, mask) for symptoms, mask in zip(symptoms_list, masks)]
+
+        with self._lock:
+            touched = self._maybe_refresh()
+
+            found: Dict[Hashable, DiseaseStats] = {}
+            missing: Dict[Hashable, str] = {}  # key -> the caller's text for it
+            for key, symptoms in zip(keys, symptoms_list):
+                entry = self._entries.get(key)
+                if entry is not None:
+                    self.hits += 1
+                    self._entries.move_to_end(key)
+                    found[key] = entry[1]
+                elif key not in found:
+                    self.misses += 1
+                    missing.setdefault(key, symptoms)
+                else:
+                    self.hits += 1
+
+            if missing:
+                # the aggregate tables are keyed by normalized text
+                texts = [normalize_symptoms(symptoms) for symptoms in missing.values()]
+                as_of, loaded = feedback_stats_snapshot(texts)
+                for key, text in zip(missing, texts):
+                    found[key] = loaded[text]
+                    self._store(key, as_of, loaded[text])
+
+            result = [dict(found[key]) for key in keys]
+
+        self._notify(touched)
+        return result
+
+    def refresh(self):
+        """Applies feedback rows added since the last refresh."""
+        with self._lock:
+            touched = self._refresh()
+        self._notify(touched)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._last_id = None
+            self._next_refresh = 0.0
+        self._notify(None)
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "refreshes": self.refreshes,
+            "hit_rate": (self.hits / lookups) if lookups else 0.0,
+        }
+
+    def _store(self, key: Hashable, as_of: int, stats: DiseaseStats):
+        self._entries[key] = (as_of, stats)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _maybe_refresh(self) -> Set[Hashable]:
+        now = time.monotonic()
+        if now >= self._next_refresh:
+            self._next_refresh = now + self.refresh_interval
+            return self._refresh()
+        return set()
+
+    def _refresh(self) -> Set[Hashable]:
+        """Applies new feedback rows; returns the symptom keys they touched."""
+        self.refreshes += 1
+
+        if self._last_id is None:
+            # nothing cached yet; entries are loaded as of their own snapshot
+            self._last_id = max_feedback_id()
+            return set()
+
+        touched = set()
+        for feedback_id, symptoms, mask, key, accepted in feedback_rows_after(self._last_id):
+            self._last_id = feedback_id
+
+            # a set cached before its symptoms were registered is keyed by
+            # its (stored, normalized) text, so both keys are touched
+            symptom_keys = (symptom_key(symptoms, mask), symptoms)
+            touched.update(symptom_keys)
+
+            for symptoms in set(symptom_keys):
+                entry = self._entries.get(symptoms)
+                if entry is None or feedback_id <= entry[0]:
+                    continue
+
+                stats = entry[1]
+                prev_accepted, prev_rejected = stats.get(key, (0, 0))
+                stats[key] = (
+                    prev_accepted + (1 if accepted == 1 else 0),
+                    prev_rejected + (1 if accepted == 0 else 0),
+                )
+
+        return touched
@@ -0,0 +1,133 @@
+import hashlib
+import json
+import os
+import struct
+from typing import Dict, List, Optional, Tuple
+
+from application.services.symptom_matrix import SymptomMatrix, np
+
+# Framing shared with score_table (little endian):
+#   magic | uint32 format version | uint32 header length | JSON header
+#   | zero padding to ALIGN | array blocks, each padded to 8 bytes
+# Snapshot blocks: padded counts int64[S+1, D] | padded order int64[S+1, D].
+# The JSON header holds the source hash, the vocab tables and the shape, plus
+# the list of ingested source files for indexes built by ingest_dataset.py.
+MAGIC = b"MDIDX\0\0\0"
+FORMAT_VERSION = 1
+ALIGN = 64
+
+_PREFIX = struct.Struct("<8sII")
+
+
+def snapshot_path_for(csv_path: str) -> str:
+    return f"{csv_path}.idx"
+
+
+def write_framed(path: str, magic: bytes, version: int, header: Dict, blocks: List):
+    """Writes header + arrays (already in file dtype) atomically (temp file + rename)."""
+    header_bytes = json.dumps(header, ensure_ascii=False).encode("utf-8")
+    data_offset = -(-(_PREFIX.size + len(header_bytes)) // ALIGN) * ALIGN
+
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(_PREFIX.pack(magic, version, len(header_bytes)))
+        f.write(header_bytes)
+        f.write(b"\0" * (data_offset - _PREFIX.size - len(header_bytes)))
+        for block in blocks:
+            data = np.ascontiguousarray(block).tobytes()
+            f.write(data)
+            f.write(b"\0" * (-len(data) % 8))
+    os.replace(tmp_path, path)
+
+
+def read_framed_header(path: str, magic: bytes, version: int) -> Tuple[Optional[Dict], int]:
+    """(JSON header, offset of the first block), or (None, 0) if unreadable or another format."""
+    try:
+        with open(path, "rb") as f:
+            file_magic, file_version, header_len = _PREFIX.unpack(f.read(_PREFIX.size))
+            if file_magic != magic or file_version != version:
+                return None, 0
+            header = json.loads(f.read(header_len).decode("utf-8"))
+    except (OSError, struct.error, ValueError):
+        return None, 0
+    return header, -(-(_PREFIX.size + header_len) // ALIGN) * ALIGN
+
+
+def map_framed_blocks(path: str, data_offset: int, blocks: List[Tuple[str, Tuple[int, ...]]]):
+    """Read-only memmaps of the (dtype, shape) blocks written by write_framed, or None."""
+    arrays = []
+    offset = data_offset
+    try:
+        for dtype, shape in blocks:
+            array = np.memmap(path, dtype=dtype, mode="r", offset=offset, shape=shape)
+            arrays.append(array)
+            offset += array.nbytes + (-array.nbytes % 8)
+    except (OSError, ValueError):
+        return None
+    return arrays
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def combined_sha256(hashes: List[str]) -> str:
+    """Source hash of an index built from several files (in ingest order)."""
+    if len(hashes) == 1:
+        return hashes[0]
+    return hashlib.sha256("\n".join(hashes).encode("ascii")).hexdigest()
+
+
+def save_snapshot(
+    path: str,
+    matrix: SymptomMatrix,
+    source_hash: str,
+    sources: Optional[List[Dict[str, str]]] = None
+):
+    """Writes the compiled index atomically (temp file + rename)."""
+    write_framed(path, MAGIC, FORMAT_VERSION, {
+        "source_sha256": source_hash,
+        "sources": sources or [],
+        "symptoms": matrix.symptoms,
+        "diseases": matrix.diseases,
+        "shape": list(matrix.padded_counts.shape),
+    }, [
+        np.asarray(matrix.padded_counts, dtype="<i8"),
+        np.asarray(matrix.padded_order, dtype="<i8"),
+    ])
+
+
+def _read_header(path: str):
+    return read_framed_header(path, MAGIC, FORMAT_VERSION)
+
+
+def read_sources(path: str) -> Optional[List[Dict[str, str]]]:
+    """Source files recorded in a snapshot, or None if it cannot be read."""
+    header, _ = _read_header(path)
+    return None if header is None else header.get("sources", [])
+
+
+def load_snapshot(path: str, source_hash: Optional[str] = None) -> Optional[SymptomMatrix]:
+    """
+    Memory-maps a snapshot written by save_snapshot. Returns None when it is
+    missing, unreadable, from another format version or (if source_hash is
+    given) built from another source file, so the caller can rebuild it.
+    """
+    header, data_offset = _read_header(path)
+    if header is None:
+        return None
+
+    if source_hash is not None and header.get("source_sha256") != source_hash:
+        return None
+
+    shape = tuple(header["shape"])
+    arrays = map_framed_blocks(path, data_offset, [("<i8", shape), ("<i8", shape)])
+    if arrays is None:
+        return None
+
+    padded_counts, padded_order = arrays
+    return SymptomMatrix(header["symptoms"], header["diseases"], padded_counts, padded_order)
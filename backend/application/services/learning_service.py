@@ -1,13 +1,25 @@
+from typing import Dict, List, Optional, Set, Tuple
+
 from domain.entities import Feedback
 from domain.enums import FeedbackResult
-from storage.db import feedback_stats_for_symptoms, feedback_stats_for_symptoms_and_disease
+from storage.db import disease_key
+from application.services.feedback_cache import FeedbackCache
 
 
 class LearningService:
-    """Very simple feedback-based learning layer."""
+    """
+    Very simple feedback-based learning layer.
+    Reads go through an in-process FeedbackCache, so steady-state scoring
+    makes no per-case feedback queries.
+    """
+
+    def __init__(self, cache_size: int = 4096, refresh_interval: float = 1.0):
+        self.cache = FeedbackCache(max_entries=cache_size, refresh_interval=refresh_interval)
 
     def trust_for_case(self, symptoms: str) -> float:
-        accepted, rejected = feedback_stats_for_symptoms(symptoms)
+        stats = self.cache.get(symptoms)
+        accepted = sum(a for a, _ in stats.values())
+        rejected = sum(r for _, r in stats.values())
         total = accepted + rejected
 
         if total == 0:
@@ -18,14 +30,50 @@ class LearningService:
         trust = 0.55 + 0.20 * ratio
         return trust
 
+    @staticmethod
+    def _is_rejected(accepted: int, rejected: int, min_rejections: int) -> bool:
+        return rejected >= min_rejections and rejected > accepted
+
     def is_disease_rejected_for_symptoms(
         self,
         symptoms: str,
         disease: str,
         min_rejections: int = 2
     ) -> bool:
-        accepted, rejected = feedback_stats_for_symptoms_and_disease(symptoms, disease)
-        return rejected >= min_rejections and rejected > accepted
+        accepted, rejected = self.cache.get(symptoms).get(disease_key(disease), (0, 0))
+        return self._is_rejected(accepted, rejected, min_rejections)
+
+    def feedback_stats_by_disease(
+        self,
+        symptoms: str,
+        symptom_mask: Optional[int] = None
+    ) -> Dict[str, Tuple[int, int]]:
+        """(accepted, rejected) per lowercased disease for one symptom set."""
+        return self.cache.get(symptoms, symptom_mask)
+
+    def feedback_stats_by_disease_batch(
+        self,
+        symptoms_list: List[str],
+        symptom_masks: Optional[List[Optional[int]]] = None
+    ) -> List[Dict[str, Tuple[int, int]]]:
+        """Per-disease stats for many symptom sets, in input order; misses load in one query."""
+        return self.cache.get_many(symptoms_list, symptom_masks)
+
+    def rejected_diseases_for_symptoms(
+        self,
+        symptoms: str,
+        min_rejections: int = 2,
+        stats: Optional[Dict[str, Tuple[int, int]]] = None,
+        symptom_mask: Optional[int] = None
+    ) -> Set[str]:
+        """Lowercased diseases rejected for these symptoms."""
+        if stats is None:
+            stats = self.feedback_stats_by_disease(symptoms, symptom_mask)
+        return {
+            disease
+            for disease, (accepted, rejected) in stats.items()
+            if self._is_rejected(accepted, rejected, min_rejections)
+        }
 
     def reset(self):
-        pass
+        self.cache.clear()
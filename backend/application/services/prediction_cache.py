@@ -0,0 +1,122 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterable, Optional, Set
+
+from application.services.feedback_cache import FeedbackCache
+
+
+class PredictionCache:
+    """
+    Bounded LRU memo of scoring results.
+
+    Each entry belongs to a symptom set (its storage.db.symptom_key). When
+    the FeedbackCache sees new feedback for a symptom set, that set's entries
+    are dropped, so a cached prediction never outlives the feedback it was
+    computed from. It starts listening on first use, so a classifier that is
+    built but never serves (e.g. a discarded retrain) registers nothing;
+    detach() stops listening and caching until attach().
+    """
+
+    def __init__(self, feedback_cache: Optional[FeedbackCache] = None, max_entries: int = 8192):
+        self.max_entries = max_entries
+        self._feedback_cache = feedback_cache
+        self._listening = False
+        self._detached = False
+
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()  # key -> (symptoms_key, value)
+        self._keys_by_symptoms: Dict[Hashable, Set[Hashable]] = {}
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def _listen(self):
+        with self._lock:
+            if self._listening or self._detached or self._feedback_cache is None:
+                return
+            self._feedback_cache.add_listener(self.invalidate)
+            self._listening = True
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        if self._feedback_cache is not None:
+            if not self._listening:
+                self._listen()
+            # picks up feedback written since the last refresh (and invalidates)
+            self._feedback_cache.poll()
+
+        with self._lock:
+            entry = None if self._detached else self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, key: Hashable, symptoms_key: Hashable, value: Any):
+        if not self._listening:
+            self._listen()
+
+        with self._lock:
+            if self._detached:
+                return  # a pass still running on a swapped-out model
+            if key in self._entries:
+                self._discard(key)
+            self._entries[key] = (symptoms_key, value)
+            self._keys_by_symptoms.setdefault(symptoms_key, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._discard(next(iter(self._entries)))
+
+    def invalidate(self, symptoms_keys: Optional[Iterable[Hashable]] = None):
+        """Drops entries for the given symptom keys (None = all)."""
+        with self._lock:
+            if symptoms_keys is None:
+                self.invalidations += len(self._entries)
+                self._entries.clear()
+                self._keys_by_symptoms.clear()
+                return
+            for symptoms_key in symptoms_keys:
+                for key in self._keys_by_symptoms.pop(symptoms_key, ()):
+                    self._entries.pop(key, None)
+                    self.invalidations += 1
+
+    def attach(self):
+        """Starts over empty and listening, e.g. when a model (re)goes live."""
+        with self._lock:
+            self._detached = False
+            self._entries.clear()
+            self._keys_by_symptoms.clear()
+        self._listen()
+
+    def detach(self):
+        """
+        Stops listening for feedback and caching, once a model is swapped out
+        or dropped; passes still running on it just miss.
+        """
+        with self._lock:
+            listening = self._listening
+            self._detached = True
+            self._listening = False
+            self._entries.clear()
+            self._keys_by_symptoms.clear()
+        if listening:
+            self._feedback_cache.remove_listener(self.invalidate)
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "hit_rate": (self.hits / lookups) if lookups else 0.0,
+        }
+
+    def _discard(self, key: Hashable):
+        symptoms_key, _ = self._entries.pop(key)
+        keys = self._keys_by_symptoms.get(symptoms_key)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_symptoms[symptoms_key]
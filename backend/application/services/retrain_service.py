@@ -0,0 +1,271 @@
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Dict, Optional, Tuple
+
+from domain.entities import ModelVersion
+from storage.db import (
+    accepted_feedback_rows,
+    activate_model_version,
+    count_feedback,
+    get_active_model_version,
+    insert_model_version,
+    max_feedback_id,
+)
+
+
+class RetrainMetrics:
+    """Retrain durations and scoring latency, split by whether a retrain was running."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.retraining = False
+        self.retrains = 0
+        self.retrain_seconds_last = 0.0
+        self.retrain_seconds_max = 0.0
+        self.retrain_seconds_total = 0.0
+        # "idle" / "retraining" -> [batches, cases, seconds, slowest batch seconds]
+        self._scoring = {"idle": [0, 0, 0.0, 0.0], "retraining": [0, 0, 0.0, 0.0]}
+
+    def retrain_started(self):
+        self.retraining = True
+
+    def retrain_finished(self, seconds: float, built: bool = True):
+        with self._lock:
+            self.retraining = False
+            if not built:
+                return  # nothing new to fold
+            self.retrains += 1
+            self.retrain_seconds_last = seconds
+            self.retrain_seconds_max = max(self.retrain_seconds_max, seconds)
+            self.retrain_seconds_total += seconds
+
+    def record_scoring(self, seconds: float, cases: int):
+        with self._lock:
+            bucket = self._scoring["retraining" if self.retraining else "idle"]
+            bucket[0] += 1
+            bucket[1] += cases
+            bucket[2] += seconds
+            bucket[3] = max(bucket[3], seconds)
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            result = {
+                "retrains": self.retrains,
+                "retrain_seconds_last": self.retrain_seconds_last,
+                "retrain_seconds_max": self.retrain_seconds_max,
+                "retrain_seconds_avg": (self.retrain_seconds_total / self.retrains) if self.retrains else 0.0,
+            }
+            for name, (batches, cases, seconds, slowest) in self._scoring.items():
+                result[f"scoring_{name}_batches"] = batches
+                result[f"scoring_{name}_ms_per_case"] = (1000.0 * seconds / cases) if cases else 0.0
+                result[f"scoring_{name}_max_batch_ms"] = 1000.0 * slowest
+            return result
+
+
+class RetrainService:
+    """
+    Incremental retraining from feedback.
+
+    A model version is the base dataset index plus every accepted feedback
+    row up to `feedback_id`. retrain() folds only the rows added since the
+    current version into a new classifier (no CSV re-parse), records the
+    version in model_versions and hot-swaps it into the ScoringService.
+    sync() brings a process up to the active version, e.g. after restart
+    or when another process trained it.
+
+    retrain_in_background() does the same work on a retrain thread; the
+    result is only handed over by apply_pending(), called from the scoring
+    loop between batches, and dropped if a newer version is already live.
+    Versions are recorded inactive while built and marked active in the
+    database only once they are live here.
+    """
+
+    def __init__(
+        self,
+        base_classifier,
+        base_version: str,
+        scoring_service=None,
+        metrics: Optional[RetrainMetrics] = None
+    ):
+        self.base_classifier = base_classifier
+        self.base_version = base_version
+        self.scoring_service = scoring_service
+        self.metrics = metrics or RetrainMetrics()
+
+        self._executor: Optional[ThreadPoolExecutor] = None
+        # its result is the built (classifier, version), or None
+        self._future: Optional[Future] = None
+
+        # (classifier, version), replaced as one reference by _activate
+        self._current = (base_classifier, ModelVersion(
+            version=base_version,
+            trained_at=datetime.now(timezone.utc),
+            accuracy=0.0,
+            active=True,
+        ))
+
+    @property
+    def classifier(self):
+        return self._current[0]
+
+    @property
+    def version(self) -> ModelVersion:
+        return self._current[1]
+
+    def retrain(self) -> Optional[ModelVersion]:
+        """Builds, records and activates a new version; None if there is nothing new."""
+        result = self._build()
+        if result is None:
+            return None
+        self._activate(*result)
+        return result[1]
+
+    @property
+    def retrain_running(self) -> bool:
+        return self._future is not None and not self._future.done()
+
+    def retrain_in_background(self) -> bool:
+        """
+        Starts a retrain on the retrain thread unless one is running or the
+        last one has not been picked up by apply_pending() yet.
+        """
+        if self._future is not None:
+            return False
+
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="retrain")
+
+        self._future = self._executor.submit(self._build)
+        return True
+
+    def apply_pending(self) -> Optional[ModelVersion]:
+        """Swaps in a finished background retrain; call from the scoring loop."""
+        future = self._future
+        if future is None or not future.done():
+            return None
+
+        self._future = None
+        error = future.exception()
+        if error is not None:
+            print(f"❌ Retrain failed: {error}")
+            return None
+
+        pending = future.result()
+        if pending is None:
+            return None
+
+        classifier, version = pending
+        if version.feedback_id <= self.version.feedback_id:
+            self._discard(classifier)
+            return None  # a newer version went live meanwhile (e.g. via sync)
+
+        self._activate(classifier, version)
+        return version
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+        # a finished build nobody picked up
+        future, self._future = self._future, None
+        if future is not None and future.exception() is None and future.result() is not None:
+            self._discard(future.result()[0])
+
+    def _build(self) -> Optional[Tuple[object, ModelVersion]]:
+        """New (classifier, version) from feedback since the current version, recorded inactive."""
+        started = time.perf_counter()
+        self.metrics.retrain_started()
+        result = None
+        try:
+            result = self._build_version()
+            return result
+        finally:
+            self.metrics.retrain_finished(time.perf_counter() - started, built=result is not None)
+
+    def _build_version(self) -> Optional[Tuple[object, ModelVersion]]:
+        base_classifier, base_version = self._current
+
+        up_to_id = max_feedback_id()
+        rows = accepted_feedback_rows(base_version.feedback_id, up_to_id)
+        if not rows:
+            return None
+
+        classifier = base_classifier.with_feedback(rows)
+
+        # acceptance rate of all feedback so far, as seen at training time
+        accepted, rejected = count_feedback()
+        total = accepted + rejected
+
+        version = ModelVersion(
+            version=f"{self.base_version}+fb{up_to_id}",
+            trained_at=datetime.now(timezone.utc),
+            accuracy=(accepted / total) if total else 0.0,
+            active=True,
+            feedback_id=up_to_id,
+        )
+        try:
+            insert_model_version(
+                version.version,
+                version.trained_at.isoformat(),
+                version.accuracy,
+                version.feedback_id,
+                len(rows),
+                active=False,
+            )
+        except Exception:
+            self._discard(classifier)
+            raise
+        return classifier, version
+
+    def sync(self) -> bool:
+        """Switches to the active version recorded in the database, if it differs."""
+        row = get_active_model_version()
+        if row is None or row[0] == self.version.version:
+            return False
+
+        name, trained_at, accuracy, feedback_id = row
+        current_classifier, current_version = self._current
+
+        if feedback_id >= current_version.feedback_id:
+            # moving forward: fold only the rows in between
+            classifier = current_classifier
+            after_id = current_version.feedback_id
+        else:
+            classifier = self.base_classifier
+            after_id = 0
+
+        rows = accepted_feedback_rows(after_id, feedback_id)
+        if rows:
+            classifier = classifier.with_feedback(rows)
+
+        self._activate(classifier, ModelVersion(
+            version=name,
+            trained_at=datetime.fromisoformat(trained_at),
+            accuracy=accuracy,
+            active=True,
+            feedback_id=feedback_id,
+        ), record=False)
+        return True
+
+    def _activate(self, classifier, version: ModelVersion, record: bool = True):
+        """Makes `version` live here and, with `record`, the active one in the database."""
+        if record:
+            activate_model_version(version.version)
+        old_classifier = self._current[0]
+        self._current = (classifier, version)
+        if self.scoring_service is not None:
+            # detaches the old classifier's cache
+            self.scoring_service.swap_model(classifier, version.version)
+        elif old_classifier is not classifier:
+            self._discard(old_classifier)
+
+    def _discard(self, classifier):
+        """Detaches the prediction cache of a classifier that will not serve here."""
+        if classifier is self.base_classifier or classifier is self.classifier:
+            return  # kept: sync may go back to the base, the current one serves
+        cache = getattr(classifier, "prediction_cache", None)
+        if cache is not None:
+            cache.detach()
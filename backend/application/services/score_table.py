@@ -0,0 +1,256 @@
+import hashlib
+import itertools
+import json
+from typing import List, Optional, Set, Tuple
+
+from application.services import index_snapshot
+from application.services.symptom_matrix import SymptomMatrix, np
+
+# Table file: index_snapshot framing with blocks
+#   diseases int16[R, W] | confidences float64[R, W]
+# Row r holds the base top-W (disease, confidence) of one symptom combination,
+# disease -1 marking unused slots. The JSON header holds the fingerprint of
+# the index it was computed from, the vocab tables, trust, W and max size.
+MAGIC = b"MDTOPK\0\0"
+FORMAT_VERSION = 1
+
+TABLE_WIDTH = 5
+BUILD_CHUNK = 20_000
+
+
+def table_path_for(index_path: str) -> str:
+    return f"{index_path}.topk"
+
+
+def _binomials(n: int, r: int):
+    """C(i, j) for i <= n, j <= r."""
+    table = np.zeros((n + 1, r + 1), dtype=np.int64)
+    table[:, 0] = 1
+    for i in range(1, n + 1):
+        table[i, 1:] = table[i - 1, 1:] + table[i - 1, :-1]
+    return table
+
+
+class ScoreTable:
+    """
+    Precomputed base top-k of every symptom combination of up to `max_size`
+    symptoms, before feedback adjustment.
+
+    Combinations are keyed by a bitmask over the sorted symptom vocabulary;
+    a mask maps to its table row through the combinatorial number system
+    (size offset + colex rank), so the table is a dense array with no hash
+    map. Lookups give exactly what SymptomMatrix.top_k / the dict path give
+    for the same symptoms in normalized (sorted, de-duplicated) order, at the
+    table's trust, when no rejected disease is among the candidates; in every
+    other case they return None and the caller scores normally.
+    """
+
+    def __init__(
+        self,
+        symptoms: List[str],
+        diseases: List[str],
+        max_size: int,
+        trust: float,
+        fingerprint: str,
+        table_diseases,
+        table_confidences
+    ):
+        self.symptoms = symptoms  # sorted
+        self.symptom_index = {s: i for i, s in enumerate(symptoms)}
+        self.diseases = diseases
+        self.max_size = max_size
+        self.trust = trust
+        self.fingerprint = fingerprint
+        self.width = table_diseases.shape[1]
+        # plain ndarray views: row reads from a memmap subclass are slower
+        self.table_diseases = table_diseases.view(np.ndarray)
+        self.table_confidences = table_confidences.view(np.ndarray)
+
+        self._binomials = _binomials(len(symptoms), max_size).tolist()
+        self._offsets = [0, 0]
+        for size in range(1, max_size + 1):
+            self._offsets.append(self._offsets[-1] + self._binomials[len(symptoms)][size])
+
+        self._disease_keys: List[Set[str]] = []  # per symptom, lowercased candidates
+
+    @staticmethod
+    def fingerprint_of(matrix: SymptomMatrix) -> str:
+        """Identifies the index content, whatever file (or none) it came from."""
+        digest = hashlib.sha256()
+        digest.update(json.dumps([matrix.symptoms, matrix.diseases], ensure_ascii=False).encode("utf-8"))
+        digest.update(np.ascontiguousarray(matrix.counts, dtype="<i8").tobytes())
+        digest.update(np.ascontiguousarray(matrix.order, dtype="<i8").tobytes())
+        return digest.hexdigest()
+
+    @classmethod
+    def build(cls, matrix: SymptomMatrix, max_size: int, trust: float = 0.0) -> "ScoreTable":
+        symptoms = sorted(matrix.symptoms)
+        rows = np.array([matrix.symptom_index[s] for s in symptoms], dtype=np.int64)
+        n_symptoms, n_diseases = len(symptoms), len(matrix.diseases)
+        max_size = min(max_size, n_symptoms)
+        width = min(TABLE_WIDTH, n_diseases)
+
+        binomials = _binomials(n_symptoms, max_size)
+        total = int(binomials[n_symptoms, 1:max_size + 1].sum())
+        table_diseases = np.full((total, width), -1, dtype=np.int16)
+        table_confidences = np.zeros((total, width), dtype=np.float64)
+
+        offset = 0
+        for size in range(1, max_size + 1):
+            n_combos = int(binomials[n_symptoms, size])
+            combos = np.fromiter(
+                itertools.chain.from_iterable(itertools.combinations(range(n_symptoms), size)),
+                dtype=np.int64,
+                count=n_combos * size,
+            ).reshape(n_combos, size)
+
+            for start in range(0, n_combos, BUILD_CHUNK):
+                chunk = combos[start:start + BUILD_CHUNK]
+
+                # the same scoring as top_k_batch for these symptoms in sorted order
+                ranked, confidence, n_candidates = matrix.rank_rows(rows[chunk], size, trust)
+                ranked = ranked[:, :width]
+
+                # colex rank of each combination within its size
+                table_rows = offset + sum(binomials[chunk[:, i], i + 1] for i in range(size))
+                picked = np.arange(width)[None, :] < n_candidates[:, None]
+                table_diseases[table_rows] = np.where(picked, ranked, -1)
+                table_confidences[table_rows] = np.where(
+                    picked, np.take_along_axis(confidence, ranked, axis=1), 0.0
+                )
+
+            offset += n_combos
+
+        table = cls(
+            symptoms, list(matrix.diseases), max_size, trust,
+            cls.fingerprint_of(matrix), table_diseases, table_confidences
+        )
+        table.index_candidates(matrix)
+        return table
+
+    def index_candidates(self, matrix: SymptomMatrix):
+        """Per symptom, the lowercased diseases it scores (for the rejection check)."""
+        self._disease_keys = []
+        for symptom in self.symptoms:
+            row = matrix.counts[matrix.symptom_index[symptom]]
+            self._disease_keys.append({matrix.diseases[j].lower() for j in np.flatnonzero(row).tolist()})
+
+    def mask_for(self, input_symptoms: List[str]) -> Optional[int]:
+        """Bitmask of the symptoms if they are known and in normalized order, else None."""
+        mask = 0
+        previous = -1
+        for symptom in input_symptoms:
+            i = self.symptom_index.get(symptom)
+            if i is None or i <= previous:
+                return None
+            mask |= 1 << i
+            previous = i
+        return mask
+
+    def row_for_mask(self, mask: int) -> Optional[int]:
+        rank = 0
+        size = 0
+        while mask:
+            low = mask & -mask
+            size += 1
+            if size > self.max_size:
+                return None
+            rank += self._binomials[low.bit_length() - 1][size]
+            mask ^= low
+        if size == 0:
+            return None
+        return self._offsets[size] + rank
+
+    def top_k_for_mask(
+        self,
+        mask: int,
+        trust: float,
+        k: int,
+        rejected: Set[str] = frozenset()
+    ) -> Optional[List[Tuple[str, float]]]:
+        if trust != self.trust or k > self.width:
+            return None
+
+        row = self.row_for_mask(mask)
+        if row is None:
+            return None
+
+        if rejected:
+            remaining = mask
+            while remaining:
+                low = remaining & -remaining
+                if not rejected.isdisjoint(self._disease_keys[low.bit_length() - 1]):
+                    return None  # the filter changes max score and ranking
+                remaining ^= low
+
+        diseases = self.diseases
+        results = []
+        for j, confidence in zip(self.table_diseases[row, :k].tolist(), self.table_confidences[row, :k].tolist()):
+            if j < 0:
+                break
+            results.append((diseases[j], confidence))
+        return results
+
+    def top_k(
+        self,
+        input_symptoms: List[str],
+        trust: float,
+        k: int,
+        rejected: Set[str] = frozenset()
+    ) -> Optional[List[Tuple[str, float]]]:
+        mask = self.mask_for(input_symptoms)
+        if mask is None:
+            return None
+        return self.top_k_for_mask(mask, trust, k, rejected)
+
+
+def save_table(path: str, table: ScoreTable):
+    """Writes the table atomically (temp file + rename)."""
+    index_snapshot.write_framed(path, MAGIC, FORMAT_VERSION, {
+        "fingerprint": table.fingerprint,
+        "symptoms": table.symptoms,
+        "diseases": table.diseases,
+        "max_size": table.max_size,
+        "trust": table.trust,
+        "shape": list(table.table_diseases.shape),
+    }, [
+        np.asarray(table.table_diseases, dtype="<i2"),
+        np.asarray(table.table_confidences, dtype="<f8"),
+    ])
+
+
+def load_table(
+    path: str,
+    matrix: SymptomMatrix,
+    max_size: int,
+    trust: float = 0.0
+) -> Optional[ScoreTable]:
+    """
+    Memory-maps a table written by save_table. Returns None when it is
+    missing, unreadable, from another format version or built from another
+    index or with other settings, so the caller can rebuild it.
+    """
+    header, data_offset = index_snapshot.read_framed_header(path, MAGIC, FORMAT_VERSION)
+    if header is None:
+        return None
+
+    if (
+        header.get("fingerprint") != ScoreTable.fingerprint_of(matrix)
+        or header.get("max_size") != min(max_size, len(matrix.symptoms))
+        or header.get("trust") != trust
+    ):
+        return None
+
+    shape = tuple(header["shape"])
+    arrays = index_snapshot.map_framed_blocks(path, data_offset, [("<i2", shape), ("<f8", shape)])
+    if arrays is None:
+        return None
+
+    table_diseases, table_confidences = arrays
+
+    table = ScoreTable(
+        header["symptoms"], header["diseases"], header["max_size"], trust,
+        header["fingerprint"], table_diseases, table_confidences
+    )
+    table.index_candidates(matrix)
+    return table
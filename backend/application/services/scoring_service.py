@@ -1,26 +1,125 @@
 from datetime import datetime, timezone
-from typing import List
+from typing import Dict, List, Optional, Tuple
 
-from domain.entities import Prediction, MedicalCase
+from domain.entities import Prediction, MedicalCase, ScoredCase, ScoredDisease
 from domain.rules import DecisionRules
-from storage.db import feedback_stats_for_symptoms_and_disease
+from storage.db import symptom_key
+from application.services.prediction_cache import PredictionCache
 
 
 class ScoringService:
     def __init__(self, classifier, learning_service, model_version: str):
-        self._classifier = classifier
+        # (classifier, version) is replaced as one reference by swap_model, so
+        # a scoring pass always sees a consistent pair without any locking
+        self._model = (classifier, model_version)
         self._learning_service = learning_service
-        self._model_version = model_version
 
-    def score_top_k(self, case: MedicalCase, k: int = 5) -> List[Prediction]:
-        raw_results = self._classifier.predict_top_k(case, trust=0.0, k=k)
+        # repeated symptom sets skip scoring; dropped when their feedback changes.
+        # keys include the model version, so results never cross a swap.
+        self.prediction_cache = PredictionCache(getattr(learning_service, "cache", None))
+
+    @property
+    def classifier(self):
+        return self._model[0]
+
+    @property
+    def model_version(self) -> str:
+        return self._model[1]
+
+    def swap_model(self, classifier, model_version: str):
+        """Hot-swaps the model; passes already running finish on the old one."""
+        old_classifier, _ = self._model
+        if old_classifier is not classifier and hasattr(classifier, "prediction_cache"):
+            classifier.prediction_cache.attach()  # may be an earlier model again
+        self._model = (classifier, model_version)
+        self.prediction_cache.invalidate()
+
+        if old_classifier is not classifier and hasattr(old_classifier, "prediction_cache"):
+            old_classifier.prediction_cache.detach()
+
+    def score_top_k(self, case: MedicalCase, k: int = 5) -> Optional[ScoredCase]:
+        classifier, model_version = self._model
+        key = (model_version, case.symptoms, k)
+        scored = self.prediction_cache.get(key)
+
+        if scored is None:
+            # fetched once and shared with the classifier's rejection filter
+            feedback_stats = self._learning_service.feedback_stats_by_disease(
+                case.symptoms, case.symptom_mask
+            )
 
+            raw_results = classifier.predict_top_k(
+                case, trust=0.0, k=k, feedback_stats=feedback_stats
+            )
+            scored = self._apply_feedback(raw_results, feedback_stats, k)
+            self.prediction_cache.put(key, symptom_key(case.symptoms, case.symptom_mask), scored)
+
+        return self._to_scored_case(case, scored, model_version, datetime.now(timezone.utc))
+
+    def score_batch(self, cases: List[MedicalCase], k: int = 5) -> List[Optional[ScoredCase]]:
+        """score_top_k for many cases with a single feedback query."""
+        classifier, model_version = self._model
+        scored_batch: List[Tuple[ScoredDisease, ...]] = [
+            self.prediction_cache.get((model_version, case.symptoms, k)) for case in cases
+        ]
+
+        misses = [i for i, scored in enumerate(scored_batch) if scored is None]
+        if misses:
+            miss_cases = [cases[i] for i in misses]
+            feedback_stats = self._learning_service.feedback_stats_by_disease_batch(
+                [case.symptoms for case in miss_cases],
+                [case.symptom_mask for case in miss_cases]
+            )
+            raw_batch = classifier.score_batch(
+                miss_cases, k=k, trust=0.0, feedback_stats=feedback_stats
+            )
+            for i, case, raw_results, stats in zip(misses, miss_cases, raw_batch, feedback_stats):
+                scored = self._apply_feedback(raw_results, stats, k)
+                self.prediction_cache.put(
+                    (model_version, case.symptoms, k), symptom_key(case.symptoms, case.symptom_mask), scored
+                )
+                scored_batch[i] = scored
+
+        created_at = datetime.now(timezone.utc)  # one timestamp per pass
+        return [
+            self._to_scored_case(case, scored, model_version, created_at)
+            for case, scored in zip(cases, scored_batch)
+        ]
+
+    @staticmethod
+    def _to_scored_case(
+        case: MedicalCase,
+        scored: Tuple[ScoredDisease, ...],
+        model_version: str,
+        created_at: datetime
+    ) -> Optional[ScoredCase]:
+        if not scored:
+            return None
+
+        # the cached candidates are shared as they are: only the main one
+        # becomes a Prediction
+        disease, confidence, decision = scored[0]
+        main = Prediction(
+            case_id=case.id,
+            predicted_disease=disease,
+            confidence=confidence,
+            decision=decision,
+            model_version=model_version,
+            created_at=created_at,
+        )
+        return ScoredCase(main, scored)
+
+    def _apply_feedback(
+        self,
+        raw_results: List[Tuple[str, float]],
+        feedback_stats: Dict[str, Tuple[int, int]],
+        k: int
+    ) -> Tuple[ScoredDisease, ...]:
         base = {disease: conf for disease, conf in raw_results}
 
         stats = {}
         for disease in base.keys():
-            accepted, rejected = feedback_stats_for_symptoms_and_disease(case.symptoms, disease)
-            stats[disease] = (accepted, rejected)
+            stats[disease] = feedback_stats.get(disease.lower(), (0, 0))
 
         winner = None
         best_acc = 0
@@ -29,7 +128,7 @@ class ScoringService:
                 best_acc = acc
                 winner = disease
 
-        predictions: List[Prediction] = []
+        scored: List[ScoredDisease] = []
 
         for disease, base_conf in base.items():
             acc, rej = stats[disease]
@@ -50,16 +149,7 @@ class ScoringService:
             confidence = max(0.05, min(0.99, base_conf + delta))
             decision = DecisionRules.decide(confidence)
 
-            predictions.append(
-                Prediction(
-                    case_id=case.id,
-                    predicted_disease=disease,
-                    confidence=confidence,
-                    decision=decision,
-                    model_version=self._model_version,
-                    created_at=datetime.now(timezone.utc),
-                )
-            )
+            scored.append(ScoredDisease(disease, confidence, decision))
 
-        predictions.sort(key=lambda p: p.confidence, reverse=True)
-        return predictions[:k]
+        scored.sort(key=lambda p: p[1], reverse=True)
+        return tuple(scored[:k])
@@ -0,0 +1,231 @@
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # optional dependency, only needed for the vectorized engine
+    np = None
+
+NUMPY_AVAILABLE = np is not None
+
+
+class SymptomMatrix:
+    """
+    Dense symptom x disease count matrix compiled from the classifier index.
+    Scoring is a row gather + column sum + nonzero count, and gives the same
+    (disease, confidence) lists as DatasetClassifier's pure Python path.
+    """
+
+    def __init__(self, symptoms: List[str], diseases: List[str], padded_counts, padded_order):
+        """
+        padded_counts / padded_order are (symptoms + 1) x diseases arrays whose
+        last row is the all-zero padding row used by batch scoring. They may be
+        read-only memory maps (see index_snapshot).
+        """
+        if np is None:
+            raise RuntimeError("numpy is required for the vectorized classifier")
+
+        self.symptoms = symptoms
+        self.symptom_index = {s: i for i, s in enumerate(symptoms)}
+        self.diseases = diseases
+
+        self.padded_counts = padded_counts
+        self.padded_order = padded_order
+        self.counts = padded_counts[:-1]
+        # insertion position of each disease inside its symptom's Counter,
+        # used to break confidence ties the same way the dict path does
+        self.order = padded_order[:-1]
+
+        self._columns_by_key: Dict[str, List[int]] = {}
+        for j, disease in enumerate(self.diseases):
+            self._columns_by_key.setdefault(disease.lower(), []).append(j)
+
+    @classmethod
+    def from_counters(cls, symptom_to_diseases: Dict[str, Dict[str, int]]) -> "SymptomMatrix":
+        if np is None:
+            raise RuntimeError("numpy is required for the vectorized classifier")
+
+        symptoms = list(symptom_to_diseases.keys())
+
+        diseases: List[str] = []
+        disease_index = {}
+        for counter in symptom_to_diseases.values():
+            for disease in counter:
+                if disease not in disease_index:
+                    disease_index[disease] = len(diseases)
+                    diseases.append(disease)
+
+        n_symptoms, n_diseases = len(symptoms), len(diseases)
+        padded_counts = np.zeros((n_symptoms + 1, n_diseases), dtype=np.int64)
+        padded_order = np.full((n_symptoms + 1, n_diseases), n_diseases, dtype=np.int64)
+
+        for i, counter in enumerate(symptom_to_diseases.values()):
+            for pos, (disease, freq) in enumerate(counter.items()):
+                j = disease_index[disease]
+                padded_counts[i, j] = freq
+                padded_order[i, j] = pos
+
+        return cls(symptoms, diseases, padded_counts, padded_order)
+
+    def to_counters(self) -> Dict[str, Counter]:
+        """Rebuilds the classifier's symptom -> Counter(disease) index, same order."""
+        symptom_to_diseases = defaultdict(Counter)
+        for i, symptom in enumerate(self.symptoms):
+            present = np.flatnonzero(self.counts[i])
+            counter = symptom_to_diseases[symptom]
+            for j in present[np.argsort(self.order[i, present], kind="stable")].tolist():
+                counter[self.diseases[j]] = int(self.counts[i, j])
+        return symptom_to_diseases
+
+    def _rejected_columns(self, rejected: Iterable[str]) -> List[int]:
+        columns = []
+        for key in rejected:
+            columns.extend(self._columns_by_key.get(key, ()))
+        return columns
+
+    @staticmethod
+    def _confidence(scores, max_score, coverage, n_symptoms, trust: float):
+        base_conf = scores / max_score
+        coverage_ratio = coverage / n_symptoms
+
+        confidence = 0.7 * base_conf + 0.3 * coverage_ratio
+        confidence = confidence * (0.6 + 0.4 * trust)
+        return np.minimum(confidence, 0.95)
+
+    def top_k(
+        self,
+        input_symptoms: List[str],
+        trust: float,
+        k: int,
+        rejected: Set[str] = frozenset()
+    ) -> Optional[List[Tuple[str, float]]]:
+        """Ranked (disease, confidence) pairs, or None when nothing scores."""
+        positions = []
+        rows = []
+        for pos, symptom in enumerate(input_symptoms):
+            row = self.symptom_index.get(symptom)
+            if row is not None:
+                positions.append(pos)
+                rows.append(row)
+
+        if not rows:
+            return None
+
+        gathered = self.counts[rows]
+        present = gathered > 0
+
+        scores = gathered.sum(axis=0)
+        if rejected:
+            scores[self._rejected_columns(rejected)] = 0
+
+        candidates = np.flatnonzero(scores)
+        if candidates.size == 0:
+            return None
+
+        cand_scores = scores[candidates]
+        confidence = self._confidence(
+            cand_scores,
+            cand_scores.max(),
+            np.count_nonzero(present[:, candidates], axis=0),
+            len(input_symptoms),
+            trust,
+        )
+
+        # first (input position, counter position) at which each disease appears
+        n_diseases = len(self.diseases)
+        first_seen = np.where(
+            present,
+            np.asarray(positions, dtype=np.int64)[:, None] * n_diseases + self.order[rows],
+            np.iinfo(np.int64).max,
+        ).min(axis=0)[candidates]
+
+        if 0 < k < candidates.size:
+            top = np.argpartition(-confidence, k - 1)[:k]
+            # keep every candidate tied with the k-th value so tie order is exact
+            selected = np.flatnonzero(confidence >= confidence[top].min())
+        else:
+            selected = np.arange(candidates.size)
+
+        ranked = selected[np.lexsort((first_seen[selected], -confidence[selected]))]
+
+        diseases = self.diseases
+        return [
+            (diseases[candidates[i]], conf)
+            for i, conf in zip(ranked.tolist(), confidence[ranked].tolist())
+        ][:k]
+
+    def top_k_batch(
+        self,
+        symptom_lists: List[List[str]],
+        trust: float,
+        k: int,
+        rejected_list: Optional[List[Set[str]]] = None
+    ) -> List[Optional[List[Tuple[str, float]]]]:
+        """top_k for many cases at once; one (cases x diseases) pass per call."""
+        n_cases = len(symptom_lists)
+        if n_cases == 0:
+            return []
+
+        pad_row = len(self.symptoms)
+        width = max(1, max(len(symptoms) for symptoms in symptom_lists))
+        rows = np.full((n_cases, width), pad_row, dtype=np.int64)
+        for r, symptoms in enumerate(symptom_lists):
+            for pos, symptom in enumerate(symptoms):
+                rows[r, pos] = self.symptom_index.get(symptom, pad_row)
+        n_symptoms = np.array([max(1, len(s)) for s in symptom_lists], dtype=np.int64)[:, None]
+
+        ranked, confidence, n_candidates = self.rank_rows(rows, n_symptoms, trust, rejected_list)
+
+        diseases = self.diseases
+        results: List[Optional[List[Tuple[str, float]]]] = []
+        for r in range(n_cases):
+            count = int(n_candidates[r])
+            if count == 0:
+                results.append(None)
+                continue
+            order = ranked[r, :count]
+            results.append([
+                (diseases[j], conf)
+                for j, conf in zip(order.tolist(), confidence[r, order].tolist())
+            ][:k])
+        return results
+
+    def rank_rows(
+        self,
+        rows,
+        n_symptoms,
+        trust: float,
+        rejected_list: Optional[List[Set[str]]] = None
+    ):
+        """
+        The scoring behind top_k_batch, on arrays: `rows` holds symptom row
+        indices (cases x width, padded with len(symptoms)), `n_symptoms` the
+        input length per case (or one for all). Returns (ranked disease
+        columns, confidences, candidate counts); candidates rank first.
+        """
+        gathered = self.padded_counts[rows]  # cases x width x diseases
+        present = gathered > 0
+
+        scores = gathered.sum(axis=1)
+        if rejected_list is not None:
+            for r, rejected in enumerate(rejected_list):
+                if rejected:
+                    scores[r, self._rejected_columns(rejected)] = 0
+
+        candidate = scores > 0
+        n_candidates = candidate.sum(axis=1)
+        max_score = np.maximum(scores.max(axis=1, keepdims=True), 1)
+
+        confidence = self._confidence(scores, max_score, present.sum(axis=1), n_symptoms, trust)
+
+        n_diseases = len(self.diseases)
+        positions = np.arange(rows.shape[1], dtype=np.int64)[None, :, None] * n_diseases
+        first_seen = np.where(
+            present,
+            positions + self.padded_order[rows],
+            np.iinfo(np.int64).max,
+        ).min(axis=1)
+
+        # non-candidates sort last; ties keep first-seen order as in top_k
+        ranked = np.lexsort((first_seen, np.where(candidate, -confidence, np.inf)), axis=-1)
+        return ranked, confidence, n_candidates
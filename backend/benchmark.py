@@ -0,0 +1,375 @@
+import argparse
+import asyncio
+import json
+import platform
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import storage.db
+from storage.db import get_connection, init_db, insert_cases
+from domain.entities import MedicalCase
+from domain.enums import CaseStatus
+from application.services.learning_service import LearningService
+from application.services.dataset_classifier import DatasetClassifier
+from application.services.db_queue_service import DbQueueService
+from application.services.symptom_matrix import NUMPY_AVAILABLE
+from agent_loop import DATASET_PATH, PRECOMPUTE_SYMPTOMS, build_classifier, build_scoring_runner
+
+SIZES = {"1k": 1_000, "100k": 100_000, "1m": 1_000_000}
+FEEDBACK_RATIO = 0.1
+INSERT_CHUNK = 10_000
+
+WARMUP_CASES = 50
+
+# unit -> whether lower or higher is better
+UNITS = {
+    "s": "lower",
+    "ms": "lower",
+    "cases/s": "higher",
+    "req/s": "higher",
+}
+
+# differences smaller than this are timer noise, whatever the percentage
+NOISE_FLOOR = {"s": 0.005, "ms": 0.05}
+
+
+class Results:
+    def __init__(self):
+        self.metrics = {}
+
+    def add(self, name: str, value: float, unit: str):
+        self.metrics[name] = {"value": round(value, 6), "unit": unit, "better": UNITS[unit]}
+        print(f"  {name:<40} {value:>12.3f} {unit}")
+
+
+def percentile(values, q: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(q * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def add_latencies(results: Results, name: str, seconds):
+    ms = [s * 1000.0 for s in seconds]
+    results.add(f"{name}.p50", percentile(ms, 0.50), "ms")
+    results.add(f"{name}.p99", percentile(ms, 0.99), "ms")
+
+
+# -------------------------------------------------
+# SYNTHETIC DATA
+# -------------------------------------------------
+
+def synthetic_symptoms(rng: random.Random, vocabulary, unknown_rate: float = 0.05) -> str:
+    picked = rng.sample(vocabulary, rng.randint(1, min(5, len(vocabulary))))
+    if rng.random() < unknown_rate:
+        picked.append(f"nepoznat simptom {rng.randint(1, 50)}")
+    return ", ".join(picked)
+
+
+def generate(rows: int, seed: int, vocabulary, diseases):
+    """Queued cases plus a feedback history (FEEDBACK_RATIO per case) in the current DB."""
+    rng = random.Random(seed)
+
+    case_ids = []
+    for start in range(0, rows, INSERT_CHUNK):
+        count = min(INSERT_CHUNK, rows - start)
+        case_ids += insert_cases([
+            (rng.randint(1, 95), rng.choice("MF"), synthetic_symptoms(rng, vocabulary))
+            for _ in range(count)
+        ])
+
+    conn = get_connection()
+    cursor = conn.cursor()
+    feedback_rows = []
+    for case_id in rng.sample(case_ids, int(rows * FEEDBACK_RATIO)):
+        cursor.execute("SELECT symptoms FROM medical_cases WHERE id = ?", (case_id,))
+        disease = rng.choice(diseases)
+        symptoms = cursor.fetchone()[0]
+        feedback_rows.append((
+            case_id, disease, storage.db.disease_key(disease), symptoms, storage.db.symptom_mask(symptoms),
+            int(rng.random() < 0.7), datetime.now(timezone.utc).isoformat(),
+        ))
+
+    # same columns as insert_feedback; the aggregate triggers keep stats current
+    cursor.executemany("""
+        INSERT INTO feedback (case_id, disease, disease_key, symptoms, symptom_mask, accepted, created_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    """, feedback_rows)
+    conn.commit()
+
+    return case_ids
+
+
+def sample_cases(case_ids, samples: int, seed: int):
+    """MedicalCase objects for a random sample of the generated cases."""
+    picked = random.Random(seed + 1).sample(case_ids, min(samples, len(case_ids)))
+    cases = []
+    for case_id in picked:
+        row = storage.db.get_case_by_id(case_id)
+        cases.append(MedicalCase(
+            row[0], row[1], row[2], row[3], CaseStatus[row[4]], datetime.now(timezone.utc),
+            storage.db.symptom_mask(row[3]),
+        ))
+    return cases
+
+
+# -------------------------------------------------
+# BENCHMARKS
+# -------------------------------------------------
+
+def best_of(repeat: int, func) -> float:
+    """Fastest of `repeat` timed runs; the minimum is the least noisy estimate."""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def bench_load(results: Results, dataset: Path, repeat: int):
+    snapshot = Path(f"{dataset}.idx")
+
+    load_csv = lambda: DatasetClassifier(str(dataset), LearningService())
+    load_snapshot = lambda: DatasetClassifier(str(dataset), LearningService(), vectorized=True, snapshot=True)
+
+    def build_snapshot():
+        if snapshot.exists():
+            snapshot.unlink()
+        load_snapshot()
+
+    results.add("classifier.load_csv", best_of(repeat, load_csv), "s")
+
+    if NUMPY_AVAILABLE:
+        results.add("classifier.load_snapshot_build", best_of(repeat, build_snapshot), "s")
+        results.add("classifier.load_snapshot", best_of(repeat, load_snapshot), "s")
+
+
+def bench_latency(results: Results, dataset: Path, cases, vectorized: bool, precompute: int = 0):
+    learning_service = LearningService()
+    classifier = DatasetClassifier(
+        str(dataset), learning_service, vectorized=vectorized, precompute=precompute
+    )
+    scoring_service = build_scoring_runner(classifier, learning_service, DbQueueService()).scoring_service
+    engine = "table" if precompute else "matrix" if vectorized else "dict"
+
+    for case in cases[:WARMUP_CASES]:
+        scoring_service.score_top_k(case)
+
+    # uncached: clear the prediction caches before every call
+    timings = []
+    for case in cases:
+        classifier.prediction_cache.invalidate()
+        started = time.perf_counter()
+        classifier.predict_top_k(case, trust=0.0, k=5)
+        timings.append(time.perf_counter() - started)
+    add_latencies(results, f"predict_top_k.{engine}", timings)
+
+    timings = []
+    for case in cases:
+        classifier.prediction_cache.invalidate()
+        scoring_service.prediction_cache.invalidate()
+        started = time.perf_counter()
+        scoring_service.score_top_k(case)
+        timings.append(time.perf_counter() - started)
+    add_latencies(results, f"score_top_k.{engine}", timings)
+
+    # cached: one pass fills the caches the loop above kept clearing
+    for case in cases:
+        scoring_service.score_top_k(case)
+
+    timings = []
+    for case in cases:
+        started = time.perf_counter()
+        scoring_service.score_top_k(case)
+        timings.append(time.perf_counter() - started)
+    add_latencies(results, f"score_top_k.{engine}.cached", timings)
+
+
+def bench_agent(results: Results, dataset: Path, limit: int):
+    # the classifier exactly as agent_loop configures it
+    learning_service = LearningService()
+    classifier = build_classifier(learning_service, dataset_path=str(dataset), index_path=None)
+    runner = build_scoring_runner(classifier, learning_service, DbQueueService())
+
+    scored = 0
+    started = time.perf_counter()
+    while scored < limit:
+        predictions = runner.drain(batch_size=64)
+        if not predictions:
+            break
+        scored += len(predictions)
+    elapsed = time.perf_counter() - started
+
+    results.add("agent.throughput", scored / elapsed if elapsed else 0.0, "cases/s")
+
+
+def bench_api(results: Results, case_ids, requests: int, concurrency: int):
+    try:
+        import httpx
+        from storage import async_db
+        from web.api import app
+    except ImportError as error:
+        print(f"  (API benchmarks skipped: {error})")
+        return
+
+    rng = random.Random(7)
+    body = {"age": 40, "gender": "F", "symptoms": "kašalj, groznica"}
+    batch = {"cases": [body] * 1000}
+
+    async def rate(make_request, count: int) -> float:
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def one():
+            async with semaphore:
+                response = await make_request()
+                response.raise_for_status()
+
+        started = time.perf_counter()
+        await asyncio.gather(*[one() for _ in range(count)])
+        return count / (time.perf_counter() - started)
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+            results.add("api.post_cases", await rate(lambda: client.post("/cases", json=body), requests), "req/s")
+            results.add(
+                "api.post_cases_batch_1000",
+                await rate(lambda: client.post("/cases/batch", json=batch), max(1, requests // 100)),
+                "req/s",
+            )
+            results.add(
+                "api.get_case",
+                await rate(lambda: client.get(f"/cases/{rng.choice(case_ids)}"), requests),
+                "req/s",
+            )
+            results.add(
+                "api.list_cases",
+                await rate(
+                    lambda: client.get("/cases", params={"after_id": rng.choice(case_ids), "limit": 100}),
+                    max(1, requests // 10),
+                ),
+                "req/s",
+            )
+
+    asyncio.run(run())
+    async_db.shutdown()
+
+
+# -------------------------------------------------
+# COMPARE
+# -------------------------------------------------
+
+def compare(baseline: dict, current: dict, tolerance: float) -> list:
+    """Metrics worse than baseline by more than `tolerance` (fraction)."""
+    regressions = []
+    for name, metric in current["metrics"].items():
+        old = baseline.get("metrics", {}).get(name)
+        if old is None or old["value"] == 0:
+            continue
+
+        change = (metric["value"] - old["value"]) / old["value"]
+        worse = change > tolerance if metric["better"] == "lower" else change < -tolerance
+        if abs(metric["value"] - old["value"]) < NOISE_FLOOR.get(metric["unit"], 0.0):
+            worse = False
+        mark = "❌" if worse else "  "
+        print(f"{mark} {name:<40} {old['value']:>12.3f} -> {metric['value']:>12.3f} {metric['unit']} ({change:+.1%})")
+        if worse:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark classifier load, scoring latency, agent throughput and API rates "
+                    "on a temporary database filled with synthetic cases."
+    )
+    parser.add_argument("--size", default="1k", help="rows to generate: 1k, 100k, 1m or a number")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--samples", type=int, default=1000, help="cases per latency measurement")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per load measurement (best counts)")
+    parser.add_argument("--agent-limit", type=int, default=50_000, help="max cases the agent scores")
+    parser.add_argument("--api-requests", type=int, default=2000)
+    parser.add_argument("--api-concurrency", type=int, default=64)
+    parser.add_argument("--skip-api", action="store_true")
+    parser.add_argument("--out", help="write results as JSON")
+    parser.add_argument("--compare", help="baseline JSON; exit 1 on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    rows = SIZES.get(args.size.lower()) or int(args.size)
+
+    with tempfile.TemporaryDirectory(prefix="medicalagent-bench-") as tmp:
+        workdir = Path(tmp)
+        storage.db.DB_PATH = workdir / "bench.db"
+        init_db()
+
+        # snapshots and score tables are written next to the dataset: use a copy
+        dataset = workdir / "dataset.csv"
+        dataset.write_bytes(Path(DATASET_PATH).read_bytes())
+
+        results = Results()
+        reference = DatasetClassifier(DATASET_PATH, LearningService())
+        vocabulary = sorted(reference.symptom_to_diseases)
+        diseases = sorted({d for counter in reference.symptom_to_diseases.values() for d in counter})
+        # as the agent does on startup, so generated cases get masks
+        storage.db.register_symptoms(reference.symptoms_by_frequency())
+
+        print(f"📦 Generating {rows:,} cases ...")
+        started = time.perf_counter()
+        case_ids = generate(rows, args.seed, vocabulary, diseases)
+        generate_seconds = time.perf_counter() - started
+
+        print("⏱️ Classifier load")
+        bench_load(results, dataset, args.repeat)
+
+        print("⏱️ Scoring latency")
+        cases = sample_cases(case_ids, args.samples, args.seed)
+        bench_latency(results, dataset, cases, vectorized=False)
+        if NUMPY_AVAILABLE:
+            bench_latency(results, dataset, cases, vectorized=True)
+            bench_latency(results, dataset, cases, vectorized=True, precompute=PRECOMPUTE_SYMPTOMS)
+
+        print("⏱️ Agent throughput")
+        bench_agent(results, dataset, args.agent_limit)
+
+        if not args.skip_api:
+            print("⏱️ API")
+            bench_api(results, case_ids, args.api_requests, args.api_concurrency)
+
+        storage.db.close_connection()
+
+    report = {
+        "meta": {
+            "rows": rows,
+            "seed": args.seed,
+            "samples": args.samples,
+            "generate_seconds": round(generate_seconds, 3),
+            "python": platform.python_version(),
+            "numpy": NUMPY_AVAILABLE,
+            "platform": platform.platform(),
+            "created_at": datetime.now(timezone.utc).isoformat(),
+        },
+        "metrics": results.metrics,
+    }
+
+    if args.out:
+        Path(args.out).write_text(json.dumps(report, indent=2), encoding="utf-8")
+        print(f"✅ Results written to {args.out}")
+
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text(encoding="utf-8"))
+        if baseline.get("meta", {}).get("rows") != rows:
+            print(f"⚠️ Baseline was run with {baseline.get('meta', {}).get('rows')} rows")
+        regressions = compare(baseline, report, args.tolerance)
+        if regressions:
+            print(f"❌ {len(regressions)} regression(s): {', '.join(regressions)}")
+            sys.exit(1)
+        print("✅ No regressions")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,9 @@
 from dataclasses import dataclass
 from datetime import datetime
+from typing import NamedTuple, Optional, Tuple
 from .enums import CaseStatus, Decision, FeedbackResult
 
-@dataclass
+@dataclass(slots=True)
 class MedicalCase:
     id: int
     age: int
@@ -10,8 +11,9 @@ class MedicalCase:
     symptoms: str
     status: CaseStatus
     created_at: datetime
+    symptom_mask: Optional[int] = None  # see storage.db SYMPTOM VOCABULARY
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class Prediction:
     case_id: int
     predicted_disease: str
@@ -20,16 +22,29 @@ class Prediction:
     model_version: str
     created_at: datetime
 
-@dataclass
+class ScoredDisease(NamedTuple):
+    """A ranked candidate disease of a scored case."""
+    predicted_disease: str
+    confidence: float
+    decision: Decision
+
+@dataclass(slots=True, frozen=True)
+class ScoredCase:
+    """Scoring result: the main prediction and all candidates, best first."""
+    prediction: Prediction
+    candidates: Tuple[ScoredDisease, ...]
+
+@dataclass(slots=True)
 class Feedback:
     case_id: int
     prediction_id: int
     result: FeedbackResult
     created_at: datetime
 
-@dataclass
+@dataclass(slots=True)
 class ModelVersion:
     version: str
     trained_at: datetime
     accuracy: float
-    active: bool    
\ No newline at end of file
+    active: bool
+    feedback_id: int = 0  # last feedback row folded into the index    
\ No newline at end of file
@@ -0,0 +1,96 @@
+import argparse
+import os
+import sys
+import time
+from collections import Counter, defaultdict
+
+from application.services import index_snapshot
+from application.services.dataset_ingestion import CHUNK_ROWS, DISEASE_FIELD, SYMPTOMS_FIELD, ingest_files
+from application.services.symptom_matrix import NUMPY_AVAILABLE, SymptomMatrix
+
+DEFAULT_INDEX = "data/index.idx"
+
+
+def make_progress_printer(interval: float = 0.5):
+    """Progress line, redrawn at most every `interval` seconds and at the end of each file."""
+    next_print = 0.0
+
+    def print_progress(path: str, rows: int, done: int, total: int):
+        nonlocal next_print
+        finished = done >= total
+        if not finished and time.monotonic() < next_print:
+            return
+        next_print = time.monotonic() + interval
+        percent = (100.0 * done / total) if total else 100.0
+        print(
+            f"\r📥 {os.path.basename(path)}: {rows:,} rows ({percent:5.1f}%)",
+            end="\n" if finished else "",
+            flush=True,
+        )
+
+    return print_progress
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Stream CSV/JSONL training files into a classifier index, "
+                    "adding new files to an existing index without rebuilding it."
+    )
+    parser.add_argument("files", nargs="+", help="CSV or JSONL (.jsonl/.ndjson) files")
+    parser.add_argument("--index", default=DEFAULT_INDEX, help=f"index file (default {DEFAULT_INDEX})")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    parser.add_argument("--symptoms-field", default=SYMPTOMS_FIELD)
+    parser.add_argument("--disease-field", default=DISEASE_FIELD)
+    parser.add_argument("--rebuild", action="store_true", help="ignore the existing index")
+    args = parser.parse_args()
+
+    if not NUMPY_AVAILABLE:
+        sys.exit("❌ numpy is required to write an index")
+
+    sources = [] if args.rebuild else (index_snapshot.read_sources(args.index) or [])
+    index = defaultdict(Counter)
+    if sources:
+        matrix = index_snapshot.load_snapshot(args.index)
+        if matrix is None:
+            sys.exit(f"❌ Cannot read {args.index}, use --rebuild")
+        index = matrix.to_counters()
+
+    known = {source["sha256"] for source in sources}
+    new_files = []
+    for path in args.files:
+        digest = index_snapshot.file_sha256(path)
+        if digest in known:
+            print(f"⏭️ {path} already in index")
+            continue
+        known.add(digest)
+        new_files.append(path)
+        sources.append({"path": os.path.abspath(path), "sha256": digest})
+
+    if not new_files:
+        print("✅ Index up to date")
+        return
+
+    started = time.perf_counter()
+    ingest_files(
+        new_files,
+        into=index,
+        workers=args.workers,
+        chunk_rows=args.chunk_rows,
+        symptoms_field=args.symptoms_field,
+        disease_field=args.disease_field,
+        progress=make_progress_printer(),
+    )
+
+    matrix = SymptomMatrix.from_counters(index)
+    source_hash = index_snapshot.combined_sha256([source["sha256"] for source in sources])
+    index_snapshot.save_snapshot(args.index, matrix, source_hash, sources)
+
+    print(
+        f"✅ Indexed {len(new_files)} file(s) in {time.perf_counter() - started:.2f}s: "
+        f"{len(matrix.symptoms)} symptoms, {len(matrix.diseases)} diseases -> {args.index}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,28 @@
+import argparse
+
+from storage.db import init_db, check_feedback_aggregates, rebuild_feedback_aggregates
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Check the feedback aggregate tables against the raw feedback rows."
+    )
+    parser.add_argument("--rebuild", action="store_true", help="rebuild even if consistent")
+    args = parser.parse_args()
+
+    init_db()
+
+    mismatches = check_feedback_aggregates()
+    for mismatch in mismatches:
+        print("✗", mismatch)
+
+    if mismatches or args.rebuild:
+        rebuild_feedback_aggregates()
+        print("🔁 Feedback aggregates rebuilt")
+        mismatches = check_feedback_aggregates()
+
+    print("✅ Feedback aggregates consistent" if not mismatches else "❌ Still inconsistent")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+import asyncio
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import List, Optional, Set, Tuple
+
+from storage import db
+
+# SQLite allows one writer at a time, so writes get a single dedicated thread
+# (no busy-waiting between writers) while WAL readers run in parallel. Each
+# thread keeps its pooled connection from storage.db for its whole life.
+READER_THREADS = 4
+
+# single-case inserts arriving within this window share one transaction
+GROUP_COMMIT_WINDOW = 0.002
+GROUP_COMMIT_MAX = 1000
+
+_executors = {}
+# db-feed: one thread (one connection) for the change feed, so PRAGMA
+# data_version is compared on the same connection every time
+_THREADS = {"db-writer": 1, "db-reader": READER_THREADS, "db-feed": 1}
+
+
+def _executor(name: str) -> ThreadPoolExecutor:
+    executor = _executors.get(name)
+    if executor is None:
+        executor = ThreadPoolExecutor(max_workers=_THREADS[name], thread_name_prefix=name)
+        _executors[name] = executor
+    return executor
+
+
+async def _run(name: str, func, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor(name), partial(func, *args, **kwargs))
+
+
+async def run_read(func, *args, **kwargs):
+    return await _run("db-reader", func, *args, **kwargs)
+
+
+async def run_write(func, *args, **kwargs):
+    return await _run("db-writer", func, *args, **kwargs)
+
+
+async def run_feed(func, *args, **kwargs):
+    return await _run("db-feed", func, *args, **kwargs)
+
+
+# -------------------------------------------------
+# GROUP COMMIT
+# -------------------------------------------------
+
+class GroupCommitWriter:
+    """
+    Collects concurrent insert_case calls and writes them with one
+    db.insert_cases transaction (one commit) per group.
+
+    A group is flushed GROUP_COMMIT_WINDOW seconds after its first case or
+    as soon as it reaches GROUP_COMMIT_MAX cases; cases arriving while a
+    flush is running on the writer thread form the next group.
+    """
+
+    def __init__(self, window: float = GROUP_COMMIT_WINDOW, max_cases: int = GROUP_COMMIT_MAX):
+        self.window = window
+        self.max_cases = max_cases
+        self._pending: List[Tuple[tuple, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        # groups being written; referenced here so they are not collected
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def insert_case(self, age: int, gender: str, symptoms: str) -> int:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append(((age, gender, symptoms), future))
+
+        if len(self._pending) >= self.max_cases:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.ensure_future(self._write(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def drain(self):
+        """Writes the pending group now and waits for every group in flight."""
+        self._flush()
+        if self._tasks:
+            await asyncio.gather(*self._tasks)
+
+    @classmethod
+    async def _write(cls, batch: List[Tuple[tuple, asyncio.Future]]):
+        try:
+            case_ids = await run_write(db.insert_cases, [case for case, _ in batch])
+        except Exception as error:
+            if len(batch) == 1:
+                cls._fail(batch[0][1], error)
+                return
+            # the whole group rolled back: retry each case on its own, so
+            # only the callers whose case is bad get an error
+            for case, future in batch:
+                await cls._write([(case, future)])
+            return
+
+        for case_id, (_, future) in zip(case_ids, batch):
+            if not future.done():
+                future.set_result(case_id)
+
+    @staticmethod
+    def _fail(future: asyncio.Future, error: Exception):
+        if not future.done():
+            future.set_exception(error)
+
+
+# one writer per event loop, since its futures and timer belong to that loop
+_group_writers: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, GroupCommitWriter]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def _group_writer() -> GroupCommitWriter:
+    loop = asyncio.get_running_loop()
+    writer = _group_writers.get(loop)
+    if writer is None:
+        writer = GroupCommitWriter()
+        _group_writers[loop] = writer
+    return writer
+
+
+async def drain_writes():
+    """Finishes this event loop's group-commit writes (call before shutdown())."""
+    writer = _group_writers.get(asyncio.get_running_loop())
+    if writer is not None:
+        await writer.drain()
+
+
+# -------------------------------------------------
+# CASES
+# -------------------------------------------------
+
+async def insert_case(age: int, gender: str, symptoms: str):
+    return await _group_writer().insert_case(age, gender, symptoms)
+
+
+async def insert_cases(cases: List[Tuple[int, str, str]]):
+    return await run_write(db.insert_cases, cases)
+
+
+async def list_cases(**filters):
+    return await run_read(db.list_cases, **filters)
+
+
+async def get_case_by_id(case_id: int):
+    return await run_read(db.get_case_by_id, case_id)
+
+
+async def queue_stats():
+    return await run_read(db.queue_stats)
+
+
+# -------------------------------------------------
+# FEEDBACK
+# -------------------------------------------------
+
+async def insert_feedback(case_id: int, disease: str, accepted: bool):
+    return await run_write(db.insert_feedback, case_id, disease, accepted)
+
+
+async def count_feedback():
+    return await run_read(db.count_feedback)
+
+
+def shutdown():
+    """Waits for queued calls and stops the DB threads (restarted on next use)."""
+    while _executors:
+        _, executor = _executors.popitem()
+        executor.shutdown(wait=True)
@@ -1,14 +1,142 @@
+import os
 import sqlite3
 import json
-from datetime import datetime, timezone
+import threading
+import time
+import weakref
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
 from domain.enums import CaseStatus
+from storage import wakeup
 
 DB_PATH = Path(__file__).resolve().parent / "medical.db"
 
 
+# WAL lets the API and the agent(s) read and write the file concurrently
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=-20000",      # ~20 MB page cache
+    "PRAGMA mmap_size=268435456",    # 256 MB memory-mapped reads
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA temp_store=MEMORY",
+)
+
+_local = threading.local()
+
+
+class _PooledConnection(sqlite3.Connection):
+    """sqlite3.Connection that can be weakly referenced (see _connections)."""
+
+
+# every open pooled connection, whatever thread owns it
+_connections = weakref.WeakSet()
+_forking = []
+# Connections a forked child inherited from its parent. They are never
+# used, closed or freed in the child: sqlite3_close on an inherited handle
+# can release POSIX locks held through the child's own connections to the
+# same file ("carrying an open database connection across a fork()" in
+# the SQLite docs). Kept alive here so thread-local cleanup cannot free them.
+_inherited_connections = []
+
+
+def _before_fork():
+    _forking[:] = list(_connections)
+
+
+def _after_fork_in_parent():
+    _forking.clear()
+
+
+def _after_fork_in_child():
+    _inherited_connections.extend(_forking)
+    _forking.clear()
+    _connections.clear()
+    _local.conn = None
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(
+        before=_before_fork,
+        after_in_parent=_after_fork_in_parent,
+        after_in_child=_after_fork_in_child,
+    )
+
+# statement tracing costs every statement a Python call, so it is only on
+# in processes that report agent metrics (see enable_statement_counting)
+_count_statements = False
+
+
+def _count_statement(statement):
+    _local.statements += 1
+
+
+def _trace_statements(conn):
+    # counts every statement this thread runs: executemany once per row,
+    # and each trigger program it fires once more
+    if not hasattr(_local, "statements"):
+        _local.statements = 0
+    conn.set_trace_callback(_count_statement)
+
+
+def _open_connection():
+    conn = sqlite3.connect(str(DB_PATH), check_same_thread=False, factory=_PooledConnection)
+    _connections.add(conn)
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+
+    if _count_statements:
+        _trace_statements(conn)
+    return conn
+
+
 def get_connection():
-    return sqlite3.connect(str(DB_PATH), check_same_thread=False)
+    """
+    Returns this thread's pooled connection, opening it on first use.
+    Connections are never shared across threads or forked processes (a
+    child opens its own and leaves the inherited ones alone, see
+    _inherited_connections) and are reopened if DB_PATH changes. Callers
+    commit but do not close; a transaction left open by a failed call is
+    rolled back on next checkout.
+    """
+    key = (os.getpid(), str(DB_PATH))
+    conn = getattr(_local, "conn", None)
+
+    if conn is None or _local.key != key:
+        conn = _open_connection()
+        _local.conn = conn
+        _local.key = key
+    elif conn.in_transaction:
+        conn.rollback()
+
+    return conn
+
+
+def close_connection():
+    """Closes the calling thread's pooled connection, if any."""
+    conn = getattr(_local, "conn", None)
+    if conn is not None and _local.key[0] == os.getpid():
+        conn.close()
+    _local.conn = None
+
+
+def enable_statement_counting():
+    """
+    Turns on statement_count() for connections opened from now on and for
+    the calling thread's current one. Off by default: the API, bulk inserts
+    and migrations run untraced.
+    """
+    global _count_statements
+    _count_statements = True
+
+    conn = getattr(_local, "conn", None)
+    if conn is not None and _local.key[0] == os.getpid():
+        _trace_statements(conn)
+
+
+def statement_count() -> int:
+    """SQL statements executed so far by the calling thread's connections (0 if not counting)."""
+    return getattr(_local, "statements", 0)
 
 
 def normalize_symptoms(symptoms: str) -> str:
@@ -17,6 +145,10 @@ def normalize_symptoms(symptoms: str) -> str:
     return ", ".join(parts)
 
 
+def disease_key(disease: str) -> str:
+    return disease.strip().lower()
+
+
 def _ensure_column(cursor, table: str, column: str, col_def: str):
     cursor.execute(f"PRAGMA table_info({table})")
     cols = {row[1] for row in cursor.fetchall()}
@@ -25,9 +157,24 @@ def _ensure_column(cursor, table: str, column: str, col_def: str):
 
 
 def init_db():
+    # the API and the agents all call this at startup: the write lock makes
+    # one of them create and migrate while the others wait, then find the
+    # schema current (user_version is only read under the lock)
     conn = get_connection()
     cursor = conn.cursor()
 
+    cursor.execute("BEGIN IMMEDIATE")
+    try:
+        _create_schema(cursor)
+        _migrate(cursor)
+    except Exception:
+        conn.rollback()
+        raise
+
+    conn.commit()
+
+
+def _create_schema(cursor):
     cursor.execute("""
         CREATE TABLE IF NOT EXISTS medical_cases (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -39,7 +186,9 @@ def init_db():
             predictions_json TEXT,
             confidence REAL,
             decision TEXT,
-            created_at TEXT NOT NULL
+            created_at TEXT NOT NULL,
+            worker_id TEXT,
+            claimed_at TEXT
         )
     """)
 
@@ -47,6 +196,8 @@ def init_db():
     _ensure_column(cursor, "medical_cases", "predictions_json", "TEXT")
     _ensure_column(cursor, "medical_cases", "confidence", "REAL")
     _ensure_column(cursor, "medical_cases", "decision", "TEXT")
+    _ensure_column(cursor, "medical_cases", "worker_id", "TEXT")
+    _ensure_column(cursor, "medical_cases", "claimed_at", "TEXT")
 
     cursor.execute("""
     CREATE TABLE IF NOT EXISTS feedback (
@@ -55,14 +206,371 @@ def init_db():
         disease TEXT NOT NULL,
         symptoms TEXT NOT NULL,
         accepted INTEGER NOT NULL,
-        created_at TEXT NOT NULL
+        created_at TEXT NOT NULL,
+        disease_key TEXT
     )
     """)
 
     _ensure_column(cursor, "feedback", "disease", "TEXT")
 
+
+# -------------------------------------------------
+# MIGRATIONS (tracked in PRAGMA user_version)
+# -------------------------------------------------
+
+def _migration_1_hot_query_indexes(cursor):
+    # pre-lowercased disease so feedback lookups need no LOWER() per row
+    _ensure_column(cursor, "feedback", "disease_key", "TEXT")
+
+    # also re-normalize symptoms written by older normalize_symptoms versions
+    # (e.g. "a,b" without the space) so they match today's lookup keys
+    cursor.execute("SELECT id, disease, symptoms FROM feedback")
+    cursor.executemany(
+        "UPDATE feedback SET disease_key = ?, symptoms = ? WHERE id = ?",
+        [
+            (disease_key(disease or ""), normalize_symptoms(symptoms), feedback_id)
+            for feedback_id, disease, symptoms in cursor.fetchall()
+        ]
+    )
+
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_feedback_symptoms_disease_key
+        ON feedback(symptoms, disease_key)
+    """)
+    cursor.execute(f"""
+        CREATE INDEX IF NOT EXISTS idx_cases_queued
+        ON medical_cases(status, id)
+        WHERE status = '{CaseStatus.QUEUED.name}'
+    """)
+
+
+def _feedback_stats_delta(row: str, sign: str) -> str:
+    """Trigger body adding (sign="") or removing (sign="-") one feedback row."""
+    key = f"COALESCE({row}.disease_key, LOWER(TRIM({row}.disease)))"
+    accepted = f"{sign}({row}.accepted = 1)"
+    rejected = f"{sign}({row}.accepted = 0)"
+    return f"""
+        INSERT INTO feedback_disease_stats (symptoms, disease_key, accepted, rejected)
+        VALUES ({row}.symptoms, {key}, {accepted}, {rejected})
+        ON CONFLICT(symptoms, disease_key) DO UPDATE SET
+            accepted = accepted + excluded.accepted,
+            rejected = rejected + excluded.rejected;
+
+        INSERT INTO feedback_symptom_stats (symptoms, accepted, rejected)
+        VALUES ({row}.symptoms, {accepted}, {rejected})
+        ON CONFLICT(symptoms) DO UPDATE SET
+            accepted = accepted + excluded.accepted,
+            rejected = rejected + excluded.rejected;
+
+        UPDATE feedback_totals
+        SET accepted = accepted + {accepted}, rejected = rejected + {rejected}
+        WHERE id = 1;
+    """
+
+
+def _migration_2_feedback_aggregates(cursor):
+    # materialized counts kept in sync by triggers, in the same transaction
+    # as the feedback write, so every stats read is a primary-key lookup
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS feedback_disease_stats (
+            symptoms TEXT NOT NULL,
+            disease_key TEXT NOT NULL,
+            accepted INTEGER NOT NULL DEFAULT 0,
+            rejected INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (symptoms, disease_key)
+        ) WITHOUT ROWID
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS feedback_symptom_stats (
+            symptoms TEXT PRIMARY KEY,
+            accepted INTEGER NOT NULL DEFAULT 0,
+            rejected INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS feedback_totals (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            accepted INTEGER NOT NULL DEFAULT 0,
+            rejected INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_feedback_stats_insert
+        AFTER INSERT ON feedback
+        BEGIN
+            {_feedback_stats_delta("NEW", "")}
+        END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_feedback_stats_delete
+        AFTER DELETE ON feedback
+        BEGIN
+            {_feedback_stats_delta("OLD", "-")}
+        END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_feedback_stats_update
+        AFTER UPDATE OF symptoms, disease, disease_key, accepted ON feedback
+        BEGIN
+            {_feedback_stats_delta("OLD", "-")}
+            {_feedback_stats_delta("NEW", "")}
+        END
+    """)
+
+    rebuild_feedback_aggregates(cursor)
+
+
+def _migration_3_model_versions(cursor):
+    # feedback_id: highest feedback row folded into the model's index
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS model_versions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            version TEXT NOT NULL UNIQUE,
+            trained_at TEXT NOT NULL,
+            accuracy REAL NOT NULL,
+            active INTEGER NOT NULL DEFAULT 0,
+            feedback_id INTEGER NOT NULL DEFAULT 0,
+            feedback_rows INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    cursor.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_model_versions_active
+        ON model_versions(active)
+        WHERE active = 1
+    """)
+
+
+def _migration_4_case_events(cursor):
+    # change feed for pushing results to API clients: every write that marks
+    # a case DIAGNOSED (update_case_status / update_case_statuses) adds a row
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS case_events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            case_id INTEGER NOT NULL,
+            status TEXT NOT NULL,
+            created_at REAL NOT NULL
+        )
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_cases_diagnosed_event
+        AFTER UPDATE OF status ON medical_cases
+        WHEN NEW.status = '{CaseStatus.DIAGNOSED.name}'
+        BEGIN
+            INSERT INTO case_events (case_id, status, created_at)
+            VALUES (NEW.id, NEW.status, (julianday('now') - 2440587.5) * 86400.0);
+        END
+    """)
+
+
+def _migration_5_case_listing_indexes(cursor):
+    # GET /cases: every filter is paired with id for keyset pagination
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_cases_status_id ON medical_cases(status, id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_cases_decision_id ON medical_cases(decision, id)")
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_cases_disease_id
+        ON medical_cases(predicted_disease COLLATE NOCASE, id)
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_cases_created_at ON medical_cases(created_at)")
+
+    # (status, id) also serves the dequeue query
+    cursor.execute("DROP INDEX IF EXISTS idx_cases_queued")
+
+
+def _migration_6_symptom_masks(cursor):
+    # stable integer ids per symptom; cases and feedback keep a bitmask of
+    # their symptom set next to the text (see SYMPTOM VOCABULARY below).
+    # Masks stay NULL until register_symptoms seeds the vocabulary.
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS symptom_vocabulary (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL UNIQUE
+        )
+    """)
+    _ensure_column(cursor, "medical_cases", "symptom_mask", "INTEGER")
+    _ensure_column(cursor, "feedback", "symptom_mask", "INTEGER")
+
+
+def _migration_7_drop_processing_index(cursor):
+    # the reaper's scan is served by idx_cases_status_id (status=PROCESSING);
+    # the planner never picked this one, it only cost every claim and write-back
+    cursor.execute("DROP INDEX IF EXISTS idx_cases_processing")
+
+
+MIGRATIONS = [
+    _migration_1_hot_query_indexes,
+    _migration_2_feedback_aggregates,
+    _migration_3_model_versions,
+    _migration_4_case_events,
+    _migration_5_case_listing_indexes,
+    _migration_6_symptom_masks,
+    _migration_7_drop_processing_index,
+]
+
+
+def _migrate(cursor):
+    cursor.execute("PRAGMA user_version")
+    version = cursor.fetchone()[0]
+
+    for target, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+        migration(cursor)
+        cursor.execute(f"PRAGMA user_version = {target}")
+
+
+# -------------------------------------------------
+# SYMPTOM VOCABULARY
+# -------------------------------------------------
+
+# Bit (id - 1) of a symptom mask stands for symptom_vocabulary row `id`;
+# ids never change. Only the model's symptoms get ids (register_symptoms,
+# seeded from the dataset); free-text symptoms entered with a case never
+# take a bit. SQLite integers are 64-bit, so a set with an unregistered
+# symptom, or one whose id > MASK_BITS, has a NULL mask and is matched by
+# its normalized text instead.
+MASK_BITS = 63
+
+_vocabulary_lock = threading.Lock()
+_vocabularies = {}  # DB_PATH -> ({name: id}, loaded at), shared by all threads
+VOCABULARY_RELOAD_SECONDS = 1.0
+
+
+def _symptom_names(symptoms: str):
+    normalized = normalize_symptoms(symptoms)
+    return normalized.split(", ") if normalized else []
+
+
+def _load_vocabulary(cursor):
+    cursor.execute("SELECT name, id FROM symptom_vocabulary")
+    return dict(cursor.fetchall())
+
+
+def _mask_of(ids, names):
+    mask = 0
+    for name in names:
+        bit = ids.get(name, MASK_BITS + 1) - 1
+        if bit >= MASK_BITS:
+            return None
+        mask |= 1 << bit
+    return mask
+
+
+def _vocabulary(names=()):
+    """
+    This process's {name: id} map, reloaded when some of `names` are not in
+    it; free-text names never are, so at most every VOCABULARY_RELOAD_SECONDS.
+    """
+    key = str(DB_PATH)
+    with _vocabulary_lock:
+        ids, loaded_at = _vocabularies.get(key, (None, 0.0))
+        if ids is not None and (
+            time.monotonic() - loaded_at < VOCABULARY_RELOAD_SECONDS
+            or all(name in ids for name in names)
+        ):
+            return ids
+
+    conn = get_connection()
+    cursor = conn.cursor()
+    loaded = _load_vocabulary(cursor)
+
+    with _vocabulary_lock:
+        _vocabularies[key] = (loaded, time.monotonic())
+    return loaded
+
+
+def _backfill_masks(cursor, ids):
+    """Sets the mask of rows stored without one that now have one; no commit."""
+    for table in ("medical_cases", "feedback"):
+        last_id = 0
+        while True:
+            cursor.execute(f"""
+                SELECT id, symptoms FROM {table}
+                WHERE id > ? AND symptom_mask IS NULL
+                ORDER BY id
+                LIMIT 10000
+            """, (last_id,))
+            rows = cursor.fetchall()
+            if not rows:
+                break
+            masks = [(_mask_of(ids, _symptom_names(symptoms)), row_id) for row_id, symptoms in rows]
+            cursor.executemany(
+                f"UPDATE {table} SET symptom_mask = ? WHERE id = ?",
+                [(mask, row_id) for mask, row_id in masks if mask is not None]
+            )
+            last_id = rows[-1][0]
+
+
+def register_symptoms(names):
+    """
+    Gives ids to the names not in the vocabulary yet, in the given order
+    (pass the most frequent first: they get the low bits), and fills in
+    the masks of stored cases and feedback that become expressible.
+    Returns how many names were added.
+    """
+    names = [name for name in dict.fromkeys(normalize_symptoms(name) for name in names) if name]
+
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    cursor.execute("BEGIN IMMEDIATE")
+    try:
+        ids = _load_vocabulary(cursor)
+        missing = [name for name in names if name not in ids]
+        if missing:
+            cursor.executemany(
+                "INSERT OR IGNORE INTO symptom_vocabulary (name) VALUES (?)",
+                [(name,) for name in missing]
+            )
+            ids = _load_vocabulary(cursor)
+            _backfill_masks(cursor, ids)
+    except Exception:
+        conn.rollback()
+        raise
+
     conn.commit()
-    conn.close()
+
+    with _vocabulary_lock:
+        _vocabularies[str(DB_PATH)] = (ids, time.monotonic())
+    return len(missing)
+
+
+def symptom_mask(symptoms: str):
+    """
+    Bitmask of a symptom set for storing it: 0 for an empty set, None when a
+    symptom is not registered or its id is beyond MASK_BITS. Never writes.
+    """
+    names = _symptom_names(symptoms)
+    return _mask_of(_vocabulary(names), names)
+
+
+def symptom_key(symptoms: str, mask=None):
+    """
+    In-process key of a symptom set: its mask, or the normalized text when
+    it has none. Pass the stored mask when there is one to skip parsing.
+    """
+    if mask is not None:
+        return mask
+    names = _symptom_names(symptoms)
+    mask = _mask_of(_vocabulary(names), names)
+    return mask if mask is not None else ", ".join(names)
+
+
+def _includes_symptoms(names):
+    """
+    WHERE fragment (and params) for rows whose symptom set includes every
+    name: a mask test, or an exact text match on rows without a mask. No
+    index can serve `mask & x = x`: the table (or the other filters' index
+    range) is scanned, with an integer AND per row instead of string matching.
+    """
+    mask = _mask_of(_vocabulary(names), names)
+    text_conditions = " AND ".join(["instr(', ' || symptoms || ', ', ?) > 0"] * len(names))
+    text_params = [f", {name}, " for name in names]
+
+    if mask is None:
+        return f"(symptom_mask IS NULL AND {text_conditions})", text_params
+    return (
+        f"(symptom_mask & ? = ? OR symptom_mask IS NULL AND {text_conditions})",
+        [mask, mask, *text_params]
+    )
 
 
 # -------------------------------------------------
@@ -71,51 +579,188 @@ def init_db():
 
 def insert_case(age: int, gender: str, symptoms: str):
     normalized_symptoms = normalize_symptoms(symptoms)
+    mask = symptom_mask(normalized_symptoms)
 
     conn = get_connection()
     cursor = conn.cursor()
 
     cursor.execute("""
-        INSERT INTO medical_cases (age, gender, symptoms, status, created_at)
-        VALUES (?, ?, ?, ?, ?)
+        INSERT INTO medical_cases (age, gender, symptoms, symptom_mask, status, created_at)
+        VALUES (?, ?, ?, ?, ?, ?)
     """, (
         age,
         gender,
         normalized_symptoms,
+        mask,
         CaseStatus.QUEUED.name,
         datetime.now(timezone.utc).isoformat()
     ))
 
     case_id = cursor.lastrowid
     conn.commit()
-    conn.close()
+
+    wakeup.notify(DB_PATH)
     return case_id
 
 
-def fetch_next_queued_case():
+def insert_cases(cases):
+    """
+    Inserts (age, gender, symptoms) tuples in one transaction and returns
+    their ids in input order.
+    """
+    if not cases:
+        return []
+
+    created_at = datetime.now(timezone.utc).isoformat()
+
+    names_list = [_symptom_names(symptoms) for _, _, symptoms in cases]
+    ids = _vocabulary({name for names in names_list for name in names})
+    rows = [
+        (age, gender, ", ".join(names), _mask_of(ids, names), CaseStatus.QUEUED.name, created_at)
+        for (age, gender, _), names in zip(cases, names_list)
+    ]
+
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    # the write lock is held from BEGIN IMMEDIATE, so the new ids are consecutive
+    cursor.execute("BEGIN IMMEDIATE")
+    try:
+        cursor.executemany("""
+            INSERT INTO medical_cases (age, gender, symptoms, symptom_mask, status, created_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, rows)
+        cursor.execute("SELECT last_insert_rowid()")
+        last_id = cursor.fetchone()[0]
+    except Exception:
+        conn.rollback()
+        raise
+
+    conn.commit()
+
+    wakeup.notify(DB_PATH)
+    return list(range(last_id - len(cases) + 1, last_id + 1))
+
+
+def fetch_next_queued_case(worker_id: str = None):
+    rows = fetch_queued_cases(1, worker_id)
+    return rows[0] if rows else None
+
+
+def fetch_queued_cases(limit: int, worker_id: str = None):
+    """
+    Atomically claims up to `limit` queued cases (oldest first) for `worker_id`.
+    BEGIN IMMEDIATE takes the write lock before the SELECT, so two workers can
+    never claim the same row; the status guard on the UPDATE is a second check.
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute("BEGIN IMMEDIATE")
+
+        # answered from idx_cases_status_id: the oldest queued ids, no sort
+        cursor.execute(f"""
+            SELECT id, age, gender, symptoms, status, symptom_mask
+            FROM medical_cases
+            WHERE status = '{CaseStatus.QUEUED.name}'
+            ORDER BY id
+            LIMIT ?
+        """, (limit,))
+
+        rows = cursor.fetchall()
+
+        if rows:
+            claimed_at = datetime.now(timezone.utc).isoformat()
+            cursor.executemany("""
+                UPDATE medical_cases
+                SET status = ?, worker_id = ?, claimed_at = ?
+                WHERE id = ? AND status = ?
+            """, [
+                (CaseStatus.PROCESSING.name, worker_id, claimed_at, row[0], CaseStatus.QUEUED.name)
+                for row in rows
+            ])
+
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+    return rows
+
+
+def queue_stats():
+    """(queued, processing, created_at of the oldest queued case or None)."""
     conn = get_connection()
     cursor = conn.cursor()
 
     cursor.execute("""
-        SELECT id, age, gender, symptoms, status
+        SELECT status, COUNT(*)
+        FROM medical_cases
+        WHERE status IN (?, ?)
+        GROUP BY status
+    """, (CaseStatus.QUEUED.name, CaseStatus.PROCESSING.name))
+    counts = dict(cursor.fetchall())
+
+    cursor.execute(f"""
+        SELECT created_at
         FROM medical_cases
-        WHERE status = ?
+        WHERE status = '{CaseStatus.QUEUED.name}'
         ORDER BY id
         LIMIT 1
-    """, (CaseStatus.QUEUED.name,))
+    """)
+    oldest = cursor.fetchone()
 
-    row = cursor.fetchone()
+    return (
+        counts.get(CaseStatus.QUEUED.name, 0),
+        counts.get(CaseStatus.PROCESSING.name, 0),
+        oldest[0] if oldest else None,
+    )
 
-    if row:
-        cursor.execute("""
-            UPDATE medical_cases
-            SET status = ?
-            WHERE id = ?
-        """, (CaseStatus.PROCESSING.name, row[0]))
-        conn.commit()
 
-    conn.close()
-    return row
+def requeue_stale_cases(lease_seconds: float):
+    """
+    Reaper: puts cases that have been PROCESSING longer than the lease back
+    into the queue (e.g. their worker crashed). Returns the number requeued.
+    """
+    cutoff = (datetime.now(timezone.utc) - timedelta(seconds=lease_seconds)).isoformat()
+
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    # answered from idx_cases_status_id: only the PROCESSING rows are read
+    cursor.execute(f"""
+        UPDATE medical_cases
+        SET status = ?, worker_id = NULL, claimed_at = NULL
+        WHERE status = '{CaseStatus.PROCESSING.name}'
+          AND (claimed_at IS NULL OR claimed_at < ?)
+    """, (CaseStatus.QUEUED.name, cutoff))
+
+    requeued = cursor.rowcount
+    conn.commit()
+
+    if requeued:
+        wakeup.notify(DB_PATH)
+    return requeued
+
+
+_UPDATE_CASE_STATUS = """
+    UPDATE medical_cases
+    SET
+        status = ?,
+        predicted_disease = ?,
+        confidence = ?,
+        decision = ?,
+        predictions_json = ?
+    WHERE id = ?
+"""
+
+# a worker whose lease was reaped (and the case claimed again) must not
+# overwrite the result or add a second DIAGNOSED event
+_UPDATE_CLAIMED_CASE_STATUS = _UPDATE_CASE_STATUS + f"""
+      AND status = '{CaseStatus.PROCESSING.name}'
+      AND worker_id = ?
+"""
 
 
 def update_case_status(
@@ -123,33 +768,61 @@ def update_case_status(
     disease: str,
     confidence: float,
     decision: str,
-    predictions=None
+    predictions=None,
+    worker_id: str = None
 ):
+    """
+    Stores a diagnosis. With `worker_id` (the claiming worker) it is only
+    written while the case is still PROCESSING under that worker's claim.
+    """
     conn = get_connection()
     cursor = conn.cursor()
 
     predictions_json = json.dumps(predictions, ensure_ascii=False) if predictions is not None else None
-
-    cursor.execute("""
-        UPDATE medical_cases
-        SET
-            status = ?,
-            predicted_disease = ?,
-            confidence = ?,
-            decision = ?,
-            predictions_json = ?
-        WHERE id = ?
-    """, (
+    params = (
         CaseStatus.DIAGNOSED.name,
         disease,
         confidence,
         decision,
         predictions_json,
         case_id
-    ))
+    )
+
+    if worker_id is None:
+        cursor.execute(_UPDATE_CASE_STATUS, params)
+    else:
+        cursor.execute(_UPDATE_CLAIMED_CASE_STATUS, (*params, worker_id))
+
+    conn.commit()
+
+
+def update_case_statuses(results, worker_id: str = None):
+    """
+    Batch version of update_case_status: writes every result with a single
+    executemany. Each result is a dict with update_case_status's arguments.
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    rows = [
+        (
+            CaseStatus.DIAGNOSED.name,
+            result["disease"],
+            result["confidence"],
+            result["decision"],
+            json.dumps(result["predictions"], ensure_ascii=False)
+            if result.get("predictions") is not None else None,
+            result["case_id"]
+        )
+        for result in results
+    ]
+
+    if worker_id is None:
+        cursor.executemany(_UPDATE_CASE_STATUS, rows)
+    else:
+        cursor.executemany(_UPDATE_CLAIMED_CASE_STATUS, [(*row, worker_id) for row in rows])
 
     conn.commit()
-    conn.close()
 
 
 def get_case_by_id(case_id: int):
@@ -172,10 +845,144 @@ def get_case_by_id(case_id: int):
     """, (case_id,))
 
     row = cursor.fetchone()
-    conn.close()
     return row
 
 
+CASE_LIST_COLUMNS = (
+    "id", "age", "gender", "symptoms", "status", "predicted_disease",
+    "confidence", "decision", "created_at",
+)
+
+
+def list_cases(
+    status: str = None,
+    decision: str = None,
+    disease: str = None,
+    created_from: str = None,
+    created_to: str = None,
+    symptoms: str = None,
+    after_id: int = 0,
+    limit: int = 100
+):
+    """
+    Cases matching the filters with id > after_id, ordered by id, as tuples
+    of CASE_LIST_COLUMNS. Pass the last id back as after_id for the next
+    page (keyset pagination: every page costs the same, however deep).
+    created_from is inclusive, created_to exclusive (ISO 8601 UTC strings);
+    symptoms keeps cases having all of the comma-separated symptoms.
+    """
+    conditions = ["id > ?"]
+    params = [after_id]
+
+    if status is not None:
+        conditions.append("status = ?")
+        params.append(status)
+    if decision is not None:
+        conditions.append("decision = ?")
+        params.append(decision)
+    if disease is not None:
+        conditions.append("predicted_disease = ? COLLATE NOCASE")
+        params.append(disease.strip())
+    if symptoms:
+        condition, condition_params = _includes_symptoms(_symptom_names(symptoms))
+        conditions.append(condition)
+        params.extend(condition_params)
+
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    # ids grow with created_at, so the time bounds become an id range and
+    # the page stays a rowid range scan; "+created_at" keeps the exact check
+    # but stops SQLite from picking idx_cases_created_at and sorting by id
+    if created_from is not None:
+        first_id = _first_case_id_from(cursor, created_from)
+        if first_id is None:
+            return []
+        conditions[0] = "id > ?"
+        params[0] = max(after_id, first_id - 1)
+        conditions.append("+created_at >= ?")
+        params.append(created_from)
+    if created_to is not None:
+        end_id = _first_case_id_from(cursor, created_to)
+        if end_id is not None:
+            conditions.append("id < ?")
+            params.append(end_id)
+        conditions.append("+created_at < ?")
+        params.append(created_to)
+
+    cursor.execute(f"""
+        SELECT {", ".join(CASE_LIST_COLUMNS)}
+        FROM medical_cases
+        WHERE {" AND ".join(conditions)}
+        ORDER BY id
+        LIMIT ?
+    """, (*params, limit))
+
+    return cursor.fetchall()
+
+
+def _first_case_id_from(cursor, created_at: str):
+    """Id of the oldest case created at or after created_at, or None."""
+    cursor.execute("""
+        SELECT id FROM medical_cases
+        WHERE created_at >= ?
+        ORDER BY created_at, id
+        LIMIT 1
+    """, (created_at,))
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+
+# -------------------------------------------------
+# CASE EVENTS (change feed)
+# -------------------------------------------------
+
+def data_version() -> int:
+    """Changes whenever another connection commits; cheap "anything new?" check."""
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    cursor.execute("PRAGMA data_version")
+    return cursor.fetchone()[0]
+
+
+def max_case_event_id() -> int:
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    cursor.execute("SELECT COALESCE(MAX(id), 0) FROM case_events")
+    return cursor.fetchone()[0]
+
+
+def case_events_after(last_id: int, limit: int = 1000):
+    """Case events with id > last_id as (id, case_id, status), oldest first."""
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    cursor.execute("""
+        SELECT id, case_id, status
+        FROM case_events
+        WHERE id > ?
+        ORDER BY id
+        LIMIT ?
+    """, (last_id, limit))
+
+    return cursor.fetchall()
+
+
+def prune_case_events(keep_seconds: float) -> int:
+    """Deletes events older than keep_seconds; returns how many."""
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    cutoff = datetime.now(timezone.utc).timestamp() - keep_seconds
+    cursor.execute("DELETE FROM case_events WHERE created_at < ?", (cutoff,))
+
+    deleted = cursor.rowcount
+    conn.commit()
+    return deleted
+
+
 # -------------------------------------------------
 # FEEDBACK
 # -------------------------------------------------
@@ -187,44 +994,35 @@ def insert_feedback(case_id: int, disease: str, accepted: bool):
     cursor.execute("SELECT symptoms FROM medical_cases WHERE id = ?", (case_id,))
     row = cursor.fetchone()
     if not row:
-        conn.close()
         raise ValueError("Case not found")
 
     normalized_symptoms = normalize_symptoms(row[0])
+    mask = symptom_mask(normalized_symptoms)
 
     cursor.execute("""
-        INSERT INTO feedback (case_id, disease, symptoms, accepted, created_at)
-        VALUES (?, ?, ?, ?, ?)
+        INSERT INTO feedback (case_id, disease, disease_key, symptoms, symptom_mask, accepted, created_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
     """, (
         case_id,
         disease.strip(),
+        disease_key(disease),
         normalized_symptoms,
+        mask,
         int(accepted),
         datetime.now(timezone.utc).isoformat()
     ))
 
     conn.commit()
-    conn.close()
-
 
 
 def count_feedback():
     conn = get_connection()
     cursor = conn.cursor()
 
-    cursor.execute("""
-        SELECT
-            SUM(CASE WHEN accepted = 1 THEN 1 ELSE 0 END),
-            SUM(CASE WHEN accepted = 0 THEN 1 ELSE 0 END)
-        FROM feedback
-    """)
-
+    cursor.execute("SELECT accepted, rejected FROM feedback_totals WHERE id = 1")
     row = cursor.fetchone()
-    conn.close()
 
-    accepted = row[0] or 0
-    rejected = row[1] or 0
-    return accepted, rejected
+    return (row[0], row[1]) if row else (0, 0)
 
 
 def feedback_stats_for_symptoms(symptoms: str):
@@ -232,20 +1030,13 @@ def feedback_stats_for_symptoms(symptoms: str):
     cursor = conn.cursor()
 
     cursor.execute("""
-        SELECT
-            SUM(CASE WHEN f.accepted = 1 THEN 1 ELSE 0 END),
-            SUM(CASE WHEN f.accepted = 0 THEN 1 ELSE 0 END)
-        FROM feedback f
-        JOIN medical_cases c ON c.id = f.case_id
-        WHERE LOWER(c.symptoms) = LOWER(?)
-    """, (symptoms,))
+        SELECT accepted, rejected
+        FROM feedback_symptom_stats
+        WHERE symptoms = ?
+    """, (normalize_symptoms(symptoms),))
 
     row = cursor.fetchone()
-    conn.close()
-
-    accepted = row[0] or 0
-    rejected = row[1] or 0
-    return accepted, rejected
+    return (row[0], row[1]) if row else (0, 0)
 
 
 def feedback_stats_for_symptoms_and_disease(symptoms: str, disease: str):
@@ -254,19 +1045,328 @@ def feedback_stats_for_symptoms_and_disease(symptoms: str, disease: str):
 
     normalized_symptoms = normalize_symptoms(symptoms)
 
+    cursor.execute("""
+        SELECT accepted, rejected
+        FROM feedback_disease_stats
+        WHERE symptoms = ?
+          AND disease_key = ?
+    """, (normalized_symptoms, disease_key(disease)))
+
+    row = cursor.fetchone()
+    return (row[0], row[1]) if row else (0, 0)
+
+
+def feedback_stats_by_disease_for_symptoms(symptoms: str):
+    """
+    Accepted/rejected counts for every disease with feedback on the given
+    symptom set, fetched in one query. Keys are disease keys (lowercased).
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    normalized_symptoms = normalize_symptoms(symptoms)
+
+    cursor.execute("""
+        SELECT disease_key, accepted, rejected
+        FROM feedback_disease_stats
+        WHERE symptoms = ?
+    """, (normalized_symptoms,))
+
+    return {
+        key: (accepted, rejected)
+        for key, accepted, rejected in cursor.fetchall()
+    }
+
+
+def _feedback_stats_by_disease_for_symptom_sets(cursor, symptom_sets):
+    keys = sorted({normalize_symptoms(s) for s in symptom_sets})
+    stats = {key: {} for key in keys}
+
+    rows = []
+    # stay well below SQLite's bound-parameter limit
+    for start in range(0, len(keys), 500):
+        chunk = keys[start:start + 500]
+        cursor.execute(f"""
+            SELECT symptoms, disease_key, accepted, rejected
+            FROM feedback_disease_stats
+            WHERE symptoms IN ({", ".join("?" * len(chunk))})
+        """, chunk)
+        rows.extend(cursor.fetchall())
+
+    for symptoms, key, accepted, rejected in rows:
+        stats[symptoms][key] = (accepted, rejected)
+    return stats
+
+
+def feedback_stats_by_disease_for_symptom_sets(symptom_sets):
+    """
+    Batch version of feedback_stats_by_disease_for_symptoms: one query for
+    all symptom sets, keyed by normalized symptoms, then disease key.
+    """
+    conn = get_connection()
+    return _feedback_stats_by_disease_for_symptom_sets(conn.cursor(), symptom_sets)
+
+
+def _max_feedback_id(cursor) -> int:
+    cursor.execute("SELECT COALESCE(MAX(id), 0) FROM feedback")
+    return cursor.fetchone()[0]
+
+
+def max_feedback_id() -> int:
+    conn = get_connection()
+    return _max_feedback_id(conn.cursor())
+
+
+def feedback_rows_after(last_id: int):
+    """Feedback rows with id > last_id as (id, symptoms, symptom_mask, disease_key, accepted)."""
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    cursor.execute("""
+        SELECT id, symptoms, symptom_mask, COALESCE(disease_key, LOWER(TRIM(disease))), accepted
+        FROM feedback
+        WHERE id > ?
+        ORDER BY id
+    """, (last_id,))
+
+    return cursor.fetchall()
+
+
+def feedback_stats_snapshot(symptom_sets):
+    """
+    feedback_stats_by_disease_for_symptom_sets plus the highest feedback id
+    they include, read in one transaction so the two are consistent.
+    Returns (max_id, stats).
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    cursor.execute("BEGIN")
+    try:
+        max_id = _max_feedback_id(cursor)
+        stats = _feedback_stats_by_disease_for_symptom_sets(cursor, symptom_sets)
+    finally:
+        conn.commit()
+
+    return max_id, stats
+
+
+def feedback_including_symptoms(symptoms: str):
+    """
+    Feedback on symptom sets that include all the given symptoms (e.g. every
+    row mentioning "kašalj"), as (id, case_id, symptoms, disease, accepted).
+    """
+    names = _symptom_names(symptoms)
+    if not names:
+        return []
+    condition, params = _includes_symptoms(names)
+
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    cursor.execute(f"""
+        SELECT id, case_id, symptoms, disease, accepted
+        FROM feedback
+        WHERE {condition}
+        ORDER BY id
+    """, params)
+
+    return cursor.fetchall()
+
+
+def accepted_feedback_rows(after_id: int, up_to_id: int):
+    """Accepted feedback with after_id < id <= up_to_id as (id, symptoms, disease)."""
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    cursor.execute("""
+        SELECT id, symptoms, disease
+        FROM feedback
+        WHERE id > ? AND id <= ? AND accepted = 1
+        ORDER BY id
+    """, (after_id, up_to_id))
+
+    return cursor.fetchall()
+
+
+# -------------------------------------------------
+# MODEL VERSIONS
+# -------------------------------------------------
+
+def insert_model_version(
+    version: str,
+    trained_at: str,
+    accuracy: float,
+    feedback_id: int,
+    feedback_rows: int,
+    active: bool = True
+):
+    """
+    Records a model version. With `active` it becomes the only active one;
+    otherwise activate_model_version() does that once it is live.
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    cursor.execute("BEGIN IMMEDIATE")
+    try:
+        cursor.execute("""
+            INSERT INTO model_versions (version, trained_at, accuracy, active, feedback_id, feedback_rows)
+            VALUES (?, ?, ?, 0, ?, ?)
+            ON CONFLICT(version) DO NOTHING
+        """, (version, trained_at, accuracy, feedback_id, feedback_rows))
+        if active:
+            _activate_model_version(cursor, version)
+    except Exception:
+        conn.rollback()
+        raise
+
+    conn.commit()
+
+
+def _activate_model_version(cursor, version: str):
+    cursor.execute("UPDATE model_versions SET active = 0 WHERE active = 1 AND version != ?", (version,))
+    cursor.execute("UPDATE model_versions SET active = 1 WHERE version = ?", (version,))
+
+
+def activate_model_version(version: str):
+    """Makes a recorded model version the only active one."""
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    cursor.execute("BEGIN IMMEDIATE")
+    try:
+        _activate_model_version(cursor, version)
+    except Exception:
+        conn.rollback()
+        raise
+
+    conn.commit()
+
+
+def get_active_model_version():
+    """(version, trained_at, accuracy, feedback_id) of the active model, or None."""
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    cursor.execute("""
+        SELECT version, trained_at, accuracy, feedback_id
+        FROM model_versions
+        WHERE active = 1
+    """)
+
+    return cursor.fetchone()
+
+
+# -------------------------------------------------
+# FEEDBACK AGGREGATES
+# -------------------------------------------------
+
+def _raw_feedback_aggregates(cursor):
     cursor.execute("""
         SELECT
+            symptoms,
+            disease_key,
             SUM(CASE WHEN accepted = 1 THEN 1 ELSE 0 END),
             SUM(CASE WHEN accepted = 0 THEN 1 ELSE 0 END)
         FROM feedback
-        WHERE symptoms = ?
-          AND LOWER(disease) = LOWER(?)
-    """, (normalized_symptoms, disease))
+        GROUP BY symptoms, disease_key
+    """)
 
-    row = cursor.fetchone()
-    conn.close()
+    by_disease = {}
+    by_symptoms = {}
+    totals = (0, 0)
+    for symptoms, key, accepted, rejected in cursor.fetchall():
+        by_disease[(symptoms, key)] = (accepted, rejected)
+        prev_accepted, prev_rejected = by_symptoms.get(symptoms, (0, 0))
+        by_symptoms[symptoms] = (prev_accepted + accepted, prev_rejected + rejected)
+        totals = (totals[0] + accepted, totals[1] + rejected)
+    return by_disease, by_symptoms, totals
 
-    accepted = row[0] or 0
-    rejected = row[1] or 0
-    return accepted, rejected
 
+def check_feedback_aggregates():
+    """
+    Compares the aggregate tables with the raw feedback rows.
+    Returns a list of human-readable mismatches (empty when consistent).
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    by_disease, by_symptoms, totals = _raw_feedback_aggregates(cursor)
+
+    cursor.execute("""
+        SELECT symptoms, disease_key, accepted, rejected
+        FROM feedback_disease_stats
+        WHERE accepted != 0 OR rejected != 0
+    """)
+    stored_by_disease = {(s, k): (a, r) for s, k, a, r in cursor.fetchall()}
+
+    cursor.execute("""
+        SELECT symptoms, accepted, rejected
+        FROM feedback_symptom_stats
+        WHERE accepted != 0 OR rejected != 0
+    """)
+    stored_by_symptoms = {s: (a, r) for s, a, r in cursor.fetchall()}
+
+    mismatches = []
+    for name, expected, stored in (
+        ("feedback_disease_stats", by_disease, stored_by_disease),
+        ("feedback_symptom_stats", by_symptoms, stored_by_symptoms),
+    ):
+        for key in sorted(set(expected) | set(stored), key=str):
+            if expected.get(key, (0, 0)) != stored.get(key, (0, 0)):
+                mismatches.append(
+                    f"{name} {key}: expected {expected.get(key, (0, 0))}, "
+                    f"stored {stored.get(key, (0, 0))}"
+                )
+
+    stored_totals = count_feedback()
+    if stored_totals != totals:
+        mismatches.append(f"feedback_totals: expected {totals}, stored {stored_totals}")
+
+    return mismatches
+
+
+def rebuild_feedback_aggregates(cursor=None):
+    """
+    Recomputes every aggregate table from the raw feedback rows. With its
+    own connection the read and the rewrite share one write transaction, so
+    feedback inserted meanwhile cannot be counted by its trigger and then
+    wiped; a caller passing `cursor` must hold the write lock already.
+    """
+    if cursor is not None:
+        _rebuild_feedback_aggregates(cursor)
+        return
+
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    cursor.execute("BEGIN IMMEDIATE")
+    try:
+        _rebuild_feedback_aggregates(cursor)
+    except Exception:
+        conn.rollback()
+        raise
+
+    conn.commit()
+
+
+def _rebuild_feedback_aggregates(cursor):
+    by_disease, by_symptoms, totals = _raw_feedback_aggregates(cursor)
+
+    cursor.execute("DELETE FROM feedback_disease_stats")
+    cursor.executemany("""
+        INSERT INTO feedback_disease_stats (symptoms, disease_key, accepted, rejected)
+        VALUES (?, ?, ?, ?)
+    """, [(s, k, a, r) for (s, k), (a, r) in by_disease.items()])
+
+    cursor.execute("DELETE FROM feedback_symptom_stats")
+    cursor.executemany("""
+        INSERT INTO feedback_symptom_stats (symptoms, accepted, rejected)
+        VALUES (?, ?, ?)
+    """, [(s, a, r) for s, (a, r) in by_symptoms.items()])
+
+    cursor.execute("""
+        INSERT INTO feedback_totals (id, accepted, rejected) VALUES (1, ?, ?)
+        ON CONFLICT(id) DO UPDATE SET accepted = excluded.accepted, rejected = excluded.rejected
+    """, totals)
@@ -0,0 +1,123 @@
+import errno
+import hashlib
+import itertools
+import os
+import select
+import socket
+import stat
+import tempfile
+from pathlib import Path
+
+# Queue wakeups over local datagram sockets: every waiting agent binds one
+# socket in a directory derived from the database path, and enqueueing sends
+# a byte to each of them. Without AF_UNIX (e.g. Windows) agents just poll.
+AVAILABLE = hasattr(socket, "AF_UNIX")
+
+_counter = itertools.count()
+
+
+def wakeup_dir(db_path) -> Path:
+    # in the temp dir, keyed by database: socket paths must stay short
+    digest = hashlib.sha1(str(Path(db_path).resolve()).encode("utf-8")).hexdigest()[:12]
+    return Path(tempfile.gettempdir()) / f"medicalagent-{digest}"
+
+
+def _check_owned(directory: Path, make_private: bool = False):
+    """
+    Raises OSError unless `directory` is a real directory of this user that
+    nobody else can access: the temp dir is shared, so another local user
+    could have created it first to read or inject wakeups. `make_private`
+    tightens the mode of our own directory (e.g. left by an older version).
+    """
+    info = os.lstat(directory)
+    if not stat.S_ISDIR(info.st_mode):
+        raise OSError(errno.ENOTDIR, "wakeup path is not a directory", str(directory))
+    if not hasattr(os, "getuid"):
+        return
+    if info.st_uid != os.getuid():
+        raise OSError(errno.EPERM, "wakeup directory owned by another user", str(directory))
+    if info.st_mode & 0o077:
+        if not make_private:
+            raise OSError(errno.EPERM, "wakeup directory accessible to other users", str(directory))
+        os.chmod(directory, 0o700)
+
+
+def notify(db_path):
+    """Wakes every agent waiting on this database; never raises."""
+    if not AVAILABLE:
+        return
+
+    directory = wakeup_dir(db_path)
+    try:
+        _check_owned(directory)
+        names = os.listdir(directory)
+    except OSError:
+        return  # no agent has ever waited (or not a directory we trust)
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+    sock.setblocking(False)
+    try:
+        for name in names:
+            path = directory / name
+            try:
+                sock.sendto(b"\0", str(path))
+            except OSError as error:
+                if error.errno == errno.ECONNREFUSED:
+                    # agent died without cleaning up
+                    try:
+                        path.unlink()
+                    except OSError:
+                        pass
+                # EAGAIN: its buffer is full of wakeups already, so it will wake
+    finally:
+        sock.close()
+
+
+class QueueWakeup:
+    """An agent's wakeup socket; wait() returns early when cases are queued."""
+
+    def __init__(self, db_path):
+        directory = wakeup_dir(db_path)
+        directory.mkdir(mode=0o700, exist_ok=True)
+        _check_owned(directory, make_private=True)
+
+        self.path = directory / f"{os.getpid()}-{next(_counter)}.sock"
+        try:
+            self.path.unlink()
+        except OSError:
+            pass
+
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._sock.bind(str(self.path))
+        self._sock.setblocking(False)
+
+    def wait(self, timeout: float) -> bool:
+        """Sleeps up to timeout seconds; True if woken by notify()."""
+        readable, _, _ = select.select([self._sock], [], [], timeout)
+        if not readable:
+            return False
+
+        # one wake per burst of inserts
+        try:
+            while True:
+                self._sock.recv(64)
+        except BlockingIOError:
+            pass
+        return True
+
+    def close(self):
+        self._sock.close()
+        try:
+            self.path.unlink()
+        except OSError:
+            pass
+
+
+def open_wakeup(db_path):
+    """QueueWakeup for this database, or None where wakeups are unsupported or unsafe."""
+    if not AVAILABLE:
+        return None
+    try:
+        return QueueWakeup(db_path)
+    except OSError:
+        return None
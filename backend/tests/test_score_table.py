@@ -0,0 +1,136 @@
+import random
+from datetime import datetime, timezone
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("numpy")
+
+import storage.db
+from application.services.dataset_classifier import DatasetClassifier
+from application.services.db_queue_service import DbQueueService
+from application.services.learning_service import LearningService
+from application.services.score_table import TABLE_WIDTH, load_table, table_path_for
+from application.services.symptom_matrix import SymptomMatrix
+from domain.entities import MedicalCase
+from domain.enums import CaseStatus
+
+DATASET = str(Path(__file__).resolve().parents[1] / "data" / "Medicina_Dataset.csv")
+MAX_SIZE = 3  # small table, quick to build
+
+
+@pytest.fixture
+def temp_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage.db, "DB_PATH", tmp_path / "test.db")
+    storage.db.init_db()
+
+
+@pytest.fixture(scope="module")
+def index_path(tmp_path_factory):
+    # no index there yet: the classifier parses the CSV and writes the table next to it
+    return str(tmp_path_factory.mktemp("index") / "dataset.idx")
+
+
+@pytest.fixture(scope="module")
+def engines(index_path):
+    """(dict, matrix, table) classifiers over the bundled dataset."""
+    dict_engine = DatasetClassifier(DATASET, LearningService(refresh_interval=0))
+    matrix_engine = DatasetClassifier(DATASET, LearningService(refresh_interval=0), vectorized=True)
+    table_engine = DatasetClassifier(
+        DATASET, LearningService(refresh_interval=0), vectorized=True,
+        index_path=index_path, precompute=MAX_SIZE
+    )
+    return dict_engine, matrix_engine, table_engine
+
+
+@pytest.fixture(scope="module")
+def matrix(engines):
+    return SymptomMatrix.from_counters(engines[0].symptom_to_diseases)
+
+
+@pytest.fixture(scope="module")
+def table(engines, index_path, matrix):
+    """The table the table engine persisted, as any later process loads it."""
+    table = load_table(table_path_for(index_path), matrix, MAX_SIZE)
+    assert table is not None
+    return table
+
+
+def assert_same(results, expected):
+    assert [disease for disease, _ in results] == [disease for disease, _ in expected]
+    assert [confidence for _, confidence in results] == pytest.approx(
+        [confidence for _, confidence in expected], abs=1e-12
+    )
+
+
+def test_table_matches_matrix_and_dict(engines, matrix, table):
+    dict_engine = engines[0]
+    diseases = sorted({d for counts in dict_engine.symptom_to_diseases.values() for d in counts})
+    rng = random.Random(7)
+
+    answered = 0
+    for _ in range(500):
+        symptoms = sorted(rng.sample(table.symptoms, rng.randint(1, MAX_SIZE)))
+        k = rng.choice([1, 3, TABLE_WIDTH])
+        rejected = {d.lower() for d in rng.sample(diseases, rng.choice([0, 0, 1, 2]))}
+
+        looked_up = table.top_k(symptoms, 0.0, k, rejected)
+        if not rejected:
+            assert looked_up is not None  # known, sorted, small enough, k <= width
+        if looked_up is None:
+            continue
+
+        answered += 1
+        assert_same(looked_up, matrix.top_k(symptoms, 0.0, k, rejected))
+        assert_same(looked_up, dict_engine._dict_top_k(symptoms, 0.0, k, rejected))
+
+    assert answered > 250
+
+
+def test_table_declines_what_it_cannot_answer(table):
+    first, second = table.symptoms[:2]
+
+    assert table.top_k([second, first], 0.0, 1) is None  # not in normalized order
+    assert table.top_k([first, "nepoznato"], 0.0, 1) is None
+    assert table.top_k(table.symptoms[:MAX_SIZE + 1], 0.0, 1) is None
+    assert table.top_k([first], 0.5, 1) is None  # other trust
+    assert table.top_k([first], 0.0, TABLE_WIDTH + 1) is None
+
+
+def test_masked_cases_score_like_text_cases(temp_db, engines, table):
+    dict_engine, matrix_engine, table_engine = engines
+    vocabulary = table.symptoms
+    rng = random.Random(3)
+
+    storage.db.register_symptoms(dict_engine.symptoms_by_frequency())
+    symptom_sets = [", ".join(rng.sample(vocabulary, rng.randint(1, MAX_SIZE + 1))) for _ in range(200)]
+    case_ids = storage.db.insert_cases([(30, "M", symptoms) for symptoms in symptom_sets])
+
+    # two rejections of a case's top disease make it rejected for that set
+    for case_id, symptoms in zip(case_ids[:40], symptom_sets[:40]):
+        text_case = MedicalCase(case_id, 30, "M", symptoms, CaseStatus.QUEUED, datetime.now(timezone.utc))
+        top_disease = matrix_engine.predict_top_k(text_case, 0.0, k=1)[0][0]
+        for _ in range(2):
+            storage.db.insert_feedback(case_id, top_disease, False)
+
+    for engine in engines:
+        engine.learning_service.reset()
+        engine.prediction_cache.invalidate()
+
+    masked_cases = DbQueueService().dequeue_batch(len(case_ids))
+    assert all(case.symptom_mask is not None for case in masked_cases)
+    text_cases = [
+        MedicalCase(case.id, case.age, case.gender, case.symptoms, case.status, case.created_at)
+        for case in masked_cases
+    ]
+
+    for k in (3, TABLE_WIDTH):
+        expected = dict_engine.score_batch(text_cases, k=k)
+        for got, want in zip(matrix_engine.score_batch(text_cases, k=k), expected):
+            assert_same(got, want)
+        for got, want in zip(table_engine.score_batch(masked_cases, k=k), expected):
+            assert_same(got, want)
+
+    table_engine.prediction_cache.invalidate()
+    for case, text_case in zip(masked_cases, text_cases):
+        assert_same(table_engine.predict_top_k(case, 0.0, k=3), dict_engine.predict_top_k(text_case, 0.0, k=3))
@@ -0,0 +1,62 @@
+import pytest
+
+import storage.db
+from storage.db import MASK_BITS
+
+KNOWN = [f"simptom {i:02d}" for i in range(MASK_BITS + 2)]  # two past the last bit
+
+
+@pytest.fixture
+def temp_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage.db, "DB_PATH", tmp_path / "test.db")
+    storage.db.init_db()
+
+
+def stored_masks(case_ids):
+    rows = storage.db.get_connection().execute(
+        f"SELECT id, symptom_mask FROM medical_cases WHERE id IN ({', '.join('?' * len(case_ids))})",
+        case_ids
+    ).fetchall()
+    return [mask for _, mask in sorted(rows)]
+
+
+def listed(symptoms):
+    return [row[0] for row in storage.db.list_cases(symptoms=symptoms)]
+
+
+def test_only_registered_symptoms_get_bits(temp_db):
+    assert storage.db.register_symptoms(KNOWN) == len(KNOWN)
+    assert storage.db.register_symptoms(KNOWN[:3]) == 0
+
+    in_bits, past_bits, free_text, mixed = storage.db.insert_cases([
+        (30, "M", f"{KNOWN[0]}, {KNOWN[MASK_BITS - 1]}"),
+        (30, "M", f"{KNOWN[0]}, {KNOWN[MASK_BITS]}"),
+        (30, "M", "nešto sasvim novo"),
+        (30, "M", f"{KNOWN[0]}, nešto sasvim novo"),
+    ])
+
+    assert stored_masks([in_bits, past_bits, free_text, mixed]) == [
+        1 | 1 << (MASK_BITS - 1), None, None, None
+    ]
+    # free text never takes a bit
+    assert "nešto sasvim novo" not in storage.db._load_vocabulary(storage.db.get_connection().cursor())
+
+    # sets without a mask are keyed and matched by their text
+    assert storage.db.symptom_key(f"{KNOWN[MASK_BITS]}, {KNOWN[0]}") == f"{KNOWN[0]}, {KNOWN[MASK_BITS]}"
+    assert listed(KNOWN[0]) == [in_bits, past_bits, mixed]
+    assert listed(KNOWN[MASK_BITS]) == [past_bits]
+    assert listed("Nešto sasvim novo") == [free_text, mixed]
+    assert listed(f"nešto sasvim novo, {KNOWN[0]}") == [mixed]
+    assert listed("nikad viđeno") == []
+
+
+def test_registering_fills_in_stored_masks(temp_db):
+    case_id = storage.db.insert_case(40, "F", "kašalj, groznica")
+    assert stored_masks([case_id]) == [None]
+    assert listed("kašalj") == [case_id]
+
+    storage.db.register_symptoms(["groznica", "kašalj"])
+
+    assert stored_masks([case_id]) == [0b11]
+    assert storage.db.symptom_key("kašalj, groznica") == 0b11
+    assert listed("kašalj") == [case_id]
@@ -1,9 +1,19 @@
-from fastapi import FastAPI
-from pydantic import BaseModel
+import csv
+import io
+from datetime import datetime, timezone
+from typing import List, Optional
+
+from fastapi import FastAPI, Query
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field
 from fastapi.middleware.cors import CORSMiddleware
 import json
 
-from storage.db import init_db, insert_case, get_case_by_id, count_feedback, insert_feedback
+from domain.enums import CaseStatus, Decision
+from storage.db import CASE_LIST_COLUMNS, init_db
+from storage import async_db
+from application.services.case_notifier import CaseNotifier
+from application.services import agent_metrics
 
 app = FastAPI(title="MedicalAIAgent API")
 
@@ -17,13 +27,36 @@ app.add_middleware(
 
 init_db()
 
+MAX_BATCH_CASES = 10_000
+MAX_AGE = 150
+MAX_WAIT_SECONDS = 30.0
+SSE_KEEPALIVE_SECONDS = 15.0
+MAX_PAGE_SIZE = 1000
+EXPORT_CHUNK = 5000
+
+STATUS_PATTERN = "^(" + "|".join(CaseStatus.__members__) + ")$"
+DECISION_PATTERN = "^(" + "|".join(Decision.__members__) + ")$"
+
+case_notifier = CaseNotifier()
+
+
+@app.on_event("shutdown")
+async def shutdown_db():
+    await case_notifier.stop()
+    await async_db.drain_writes()
+    async_db.shutdown()
+
 
 class MedicalCaseCreateDto(BaseModel):
-    age: int
+    age: int = Field(ge=0, le=MAX_AGE)
     gender: str
     symptoms: str
 
 
+class MedicalCaseBatchDto(BaseModel):
+    cases: List[MedicalCaseCreateDto] = Field(max_length=MAX_BATCH_CASES)
+
+
 class FeedbackCreateDto(BaseModel):
     case_id: int
     disease: str
@@ -31,8 +64,8 @@ class FeedbackCreateDto(BaseModel):
 
 
 @app.post("/cases")
-def create_case(dto: MedicalCaseCreateDto):
-    case_id = insert_case(
+async def create_case(dto: MedicalCaseCreateDto):
+    case_id = await async_db.insert_case(
         age=dto.age,
         gender=dto.gender,
         symptoms=dto.symptoms
@@ -41,15 +74,24 @@ def create_case(dto: MedicalCaseCreateDto):
     return {"case_id": case_id, "status": "QUEUED"}
 
 
+@app.post("/cases/batch")
+async def create_cases(dto: MedicalCaseBatchDto):
+    case_ids = await async_db.insert_cases([
+        (case.age, case.gender, case.symptoms) for case in dto.cases
+    ])
+
+    return {"case_ids": case_ids, "status": "QUEUED"}
+
+
 @app.post("/feedback")
-def submit_feedback(dto: FeedbackCreateDto):
-    insert_feedback(dto.case_id, dto.disease, dto.accepted)
+async def submit_feedback(dto: FeedbackCreateDto):
+    await async_db.insert_feedback(dto.case_id, dto.disease, dto.accepted)
     return {"status": "feedback received"}
 
 
 @app.get("/stats")
-def get_stats():
-    accepted, rejected = count_feedback()
+async def get_stats():
+    accepted, rejected = await async_db.count_feedback()
     total = accepted + rejected
     rejection_rate = (rejected / total) if total > 0 else 0.0
 
@@ -61,12 +103,130 @@ def get_stats():
     }
 
 
-@app.get("/cases/{case_id}")
-def get_case(case_id: int):
-    row = get_case_by_id(case_id)
-    if not row:
-        return {"error": "Case not found"}
+@app.get("/metrics")
+async def metrics():
+    """
+    Prometheus text format: live queue gauges plus the stage timings and
+    SQL counters every running agent writes to its metrics file.
+    """
+    queued, processing, oldest = await async_db.queue_stats()
+    oldest_age = (
+        (datetime.now(timezone.utc) - datetime.fromisoformat(oldest)).total_seconds()
+        if oldest else 0.0
+    )
+
+    samples = [
+        agent_metrics.sample("medical_queue_cases", queued, status=CaseStatus.QUEUED.name),
+        agent_metrics.sample("medical_queue_cases", processing, status=CaseStatus.PROCESSING.name),
+        agent_metrics.sample("medical_queue_oldest_age_seconds", f"{max(oldest_age, 0.0):.3f}"),
+    ]
+    # file reads stay off the event loop
+    samples += await async_db.run_read(agent_metrics.read_agent_samples)
+
+    return PlainTextResponse(agent_metrics.render(samples), media_type="text/plain; version=0.0.4")
+
+
+def _utc_iso(value: Optional[datetime]) -> Optional[str]:
+    # created_at is stored as UTC isoformat; naive datetimes are taken as UTC
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc).isoformat()
+
+
+def _case_filters(status, decision, disease, created_from, created_to, symptoms):
+    return {
+        "status": status,
+        "decision": decision,
+        "disease": disease,
+        "created_from": _utc_iso(created_from),
+        "created_to": _utc_iso(created_to),
+        "symptoms": symptoms,
+    }
+
+
+@app.get("/cases")
+async def list_cases(
+    status: Optional[str] = Query(None, pattern=STATUS_PATTERN),
+    decision: Optional[str] = Query(None, pattern=DECISION_PATTERN),
+    disease: Optional[str] = None,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    symptoms: Optional[str] = None,
+    after_id: int = 0,
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE)
+):
+    """
+    One page of cases by id; pass `next_after_id` as `after_id` for the next
+    page. `symptoms` (comma-separated) keeps cases that have all of them.
+    """
+    rows = await async_db.list_cases(
+        **_case_filters(status, decision, disease, created_from, created_to, symptoms),
+        after_id=after_id,
+        limit=limit,
+    )
+
+    return {
+        "items": [dict(zip(CASE_LIST_COLUMNS, row)) for row in rows],
+        "next_after_id": rows[-1][0] if len(rows) == limit else None
+    }
+
+
+@app.get("/cases/export")
+async def export_cases(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    status: Optional[str] = Query(None, pattern=STATUS_PATTERN),
+    decision: Optional[str] = Query(None, pattern=DECISION_PATTERN),
+    disease: Optional[str] = None,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    symptoms: Optional[str] = None
+):
+    """
+    Streams every matching case as NDJSON or CSV. Rows are read in keyset
+    chunks of EXPORT_CHUNK, so memory stays flat however many rows match.
+    """
+    filters = _case_filters(status, decision, disease, created_from, created_to, symptoms)
+
+    async def rows():
+        after_id = 0
+        while True:
+            chunk = await async_db.list_cases(**filters, after_id=after_id, limit=EXPORT_CHUNK)
+            if not chunk:
+                return
+            yield chunk
+            after_id = chunk[-1][0]
 
+    async def ndjson():
+        async for chunk in rows():
+            yield "".join(
+                json.dumps(dict(zip(CASE_LIST_COLUMNS, row)), ensure_ascii=False) + "\n"
+                for row in chunk
+            )
+
+    async def csv_lines():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(CASE_LIST_COLUMNS)
+        async for chunk in rows():
+            writer.writerows(chunk)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue()
+
+    if format == "csv":
+        return StreamingResponse(
+            csv_lines(),
+            media_type="text/csv",
+            headers={"Content-Disposition": "attachment; filename=cases.csv"},
+        )
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+
+def _case_payload(row):
     predictions = json.loads(row[8]) if row[8] else []
 
     return {
@@ -82,3 +242,54 @@ def get_case(case_id: int):
         } if row[4] == "DIAGNOSED" else None,
         "other_predictions": predictions
     }
+
+
+async def _wait_for_diagnosis(case_id: int, timeout: float):
+    """
+    Case row once it is DIAGNOSED or timeout seconds have passed. Subscribes
+    before reading the row, so a diagnosis written in between is not missed.
+    """
+    future = await case_notifier.subscribe(case_id)
+    try:
+        row = await async_db.get_case_by_id(case_id)
+        if row and row[4] != "DIAGNOSED" and await case_notifier.wait(future, timeout):
+            row = await async_db.get_case_by_id(case_id)
+        return row
+    finally:
+        case_notifier.unsubscribe(case_id, future)
+
+
+@app.get("/cases/{case_id}")
+async def get_case(case_id: int, wait: float = 0.0):
+    """`wait` > 0 long-polls up to that many seconds for the diagnosis."""
+    if wait > 0:
+        row = await _wait_for_diagnosis(case_id, min(wait, MAX_WAIT_SECONDS))
+    else:
+        row = await async_db.get_case_by_id(case_id)
+
+    if not row:
+        return {"error": "Case not found"}
+
+    return _case_payload(row)
+
+
+@app.get("/cases/{case_id}/events")
+async def case_events(case_id: int):
+    """Server-Sent Events: one `diagnosed` event with the case, then the stream ends."""
+
+    async def stream():
+        while True:
+            row = await _wait_for_diagnosis(case_id, SSE_KEEPALIVE_SECONDS)
+            if not row:
+                yield f"event: error\ndata: {json.dumps({'error': 'Case not found'})}\n\n"
+                return
+            if row[4] == "DIAGNOSED":
+                yield f"event: diagnosed\ndata: {json.dumps(_case_payload(row), ensure_ascii=False)}\n\n"
+                return
+            yield ": keepalive\n\n"
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"},
+    )
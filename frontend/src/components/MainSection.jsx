@@ -61,7 +61,8 @@ function MainSection() {
     }
 
     try {
-      const res = await fetch(`http://127.0.0.1:8000/cases/${caseId}`);
+      // long-poll: the API answers as soon as the agent writes the diagnosis
+      const res = await fetch(`http://127.0.0.1:8000/cases/${caseId}?wait=25`);
       const data = await res.json();
       console.log("CASE RESPONSE:", data);
 